@@ -0,0 +1,204 @@
+# accounts/authentication.py
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def get_mode():
+    """'token' (DB-backed authtoken keys) or 'jwt' (signed access + refresh tokens)."""
+    return getattr(settings, 'AUTH_TOKEN_MODE', 'token')
+
+
+def issue_jwt(user):
+    refresh = RefreshToken.for_user(user)
+    return {'access': str(refresh.access_token), 'refresh': str(refresh)}
+
+
+class LocalLRUCache:
+    """Small thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TokenUserCache:
+    """
+    Two-tier credential -> user cache: a short-lived per-process LRU in front
+    of the shared Django cache. Keys are hashed so raw tokens never leave the
+    process. Invalidation (see accounts/signals.py) clears the shared tier
+    and this process's LRU; other processes expire theirs within
+    AUTH_TOKEN_LOCAL_CACHE_TTL seconds.
+    """
+
+    def __init__(self, prefix='auth:token:'):
+        self.prefix = prefix
+        self.local = LocalLRUCache(getattr(settings, 'AUTH_TOKEN_LOCAL_CACHE_SIZE', 1024))
+
+    def cache_key(self, token_key):
+        return self.prefix + hashlib.sha256(token_key.encode()).hexdigest()
+
+    def get(self, token_key):
+        cache_key = self.cache_key(token_key)
+        user = self.local.get(cache_key)
+        if user is None:
+            user = cache.get(cache_key)
+            if user is None:
+                return None
+            self.local.set(cache_key, user, getattr(settings, 'AUTH_TOKEN_LOCAL_CACHE_TTL', 10))
+        # Hand out a copy so one request cannot mutate another's user
+        return copy.copy(user)
+
+    def set(self, token_key, user):
+        cache_key = self.cache_key(token_key)
+        user = _without_password(user)
+        cache.set(cache_key, user, getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300))
+        self.local.set(cache_key, user, getattr(settings, 'AUTH_TOKEN_LOCAL_CACHE_TTL', 10))
+
+    def invalidate(self, *token_keys):
+        cache_keys = [self.cache_key(token_key) for token_key in token_keys]
+        cache.delete_many(cache_keys)
+        for cache_key in cache_keys:
+            self.local.delete(cache_key)
+
+
+def _without_password(user):
+    """
+    Copy of ``user`` with the password hash deferred, so hashes are never
+    written to the shared cache (a deferred field is re-read from the
+    database on access and skipped by save()).
+    """
+    fields = [field.attname for field in user._meta.concrete_fields if field.attname != 'password']
+    return type(user).from_db(user._state.db, fields, [getattr(user, name) for name in fields])
+
+
+token_user_cache = TokenUserCache()
+# JWTs carry the user id, so signed-token mode caches users by id
+jwt_user_cache = TokenUserCache(prefix='auth:user:')
+
+
+class RevocationList:
+    """
+    JWT ids (jti) revoked before they expire, i.e. by logout or refresh
+    rotation. Each entry lives in the shared cache only until its token would
+    have expired anyway, so the list never outgrows the set of live tokens; a
+    bounded per-process LRU answers repeat checks of revoked tokens locally.
+    """
+
+    def __init__(self):
+        self.local = LocalLRUCache(getattr(settings, 'AUTH_JWT_REVOCATION_LOCAL_SIZE', 4096))
+
+    @staticmethod
+    def cache_key(token):
+        return 'auth:revoked:' + str(token.get(jwt_settings.JTI_CLAIM))
+
+    @staticmethod
+    def remaining_lifetime(token):
+        return int(token['exp'] - time.time())
+
+    def revoke(self, token):
+        timeout = self.remaining_lifetime(token)
+        if timeout <= 0:
+            return
+        cache_key = self.cache_key(token)
+        cache.set(cache_key, True, timeout)
+        self.local.set(cache_key, True, timeout)
+
+    def is_revoked(self, token):
+        cache_key = self.cache_key(token)
+        if self.local.get(cache_key):
+            return True
+        if cache.get(cache_key) is None:
+            return False
+        self.local.set(cache_key, True, max(self.remaining_lifetime(token), 1))
+        return True
+
+
+revocation_list = RevocationList()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for DRF's TokenAuthentication that resolves
+    token -> user from the cache, so authenticated requests do not pay a
+    Token + CustomUser join on every call.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_user_cache.get(key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            token_user_cache.set(key, user)
+            return (user, token)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        # Unsaved stand-in for request.auth; only the key and user are known
+        return (user, Token(key=key, user=user))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Bearer-token authentication for AUTH_TOKEN_MODE = 'jwt'. The signature
+    and expiry are checked in-process, the jti against the revocation list,
+    and the user comes from the cache; only a cold cache reads the database.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if revocation_list.is_revoked(validated_token):
+            raise InvalidToken('Token has been revoked.')
+        return validated_token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        user = jwt_user_cache.get(str(user_id))
+        if user is None:
+            user = super().get_user(validated_token)
+            jwt_user_cache.set(str(user_id), user)
+        elif not user.is_active:
+            raise exceptions.AuthenticationFailed('User is inactive.', code='user_inactive')
+        return user
@@ -0,0 +1,154 @@
+# accounts/expansion.py
+"""
+User expansion for serializers.
+
+Posts, comments and notifications reference users by id. Instead of joining
+the user row into every query (or worse, walking obj.author per row), list
+views collect every user id on the page and load the compact summaries
+({id, username, avatar}) once: from a per-request identity map, then from a
+short-lived shared cache (USER_SUMMARY_CACHE_TTL) that keeps hot authors out
+of the database, and only then with a single ``pk__in`` query.
+
+Serializers read summaries through UserExpansionSerializerMixin; clients can
+ask for them inline with ?expand=author (or actor, recent_actors, ...).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from .models import CustomUser
+
+# Thumbnail used as the avatar in summaries (see accounts/images.py)
+AVATAR_SIZE = '96'
+AVATAR_FORMAT = 'jpeg'
+
+
+def cache_key(user_id):
+    return f'user:summary:{user_id}'
+
+
+def summarize(user):
+    variants = user.profile_picture_variants or {}
+    if AVATAR_SIZE in variants:
+        avatar = default_storage.url(variants[AVATAR_SIZE][AVATAR_FORMAT])
+    elif user.profile_picture:
+        avatar = user.profile_picture.url
+    else:
+        avatar = None
+    return {'id': user.pk, 'username': user.username, 'avatar': avatar}
+
+
+def invalidate(*user_ids):
+    cache.delete_many([cache_key(user_id) for user_id in user_ids])
+
+
+class UserExpander:
+    """Per-request identity map of user summaries."""
+
+    def __init__(self):
+        self._summaries = {}
+
+    def load(self, user_ids):
+        missing = {user_id for user_id in user_ids if user_id is not None} - self._summaries.keys()
+        if not missing:
+            return
+        cached = cache.get_many([cache_key(user_id) for user_id in missing])
+        for summary in cached.values():
+            self._summaries[summary['id']] = summary
+        missing -= self._summaries.keys()
+        if not missing:
+            return
+
+        users = CustomUser.objects.filter(pk__in=missing).only(
+            'id', 'username', 'profile_picture', 'profile_picture_variants'
+        )
+        fresh = {user.pk: summarize(user) for user in users}
+        cache.set_many(
+            {cache_key(user_id): summary for user_id, summary in fresh.items()},
+            getattr(settings, 'USER_SUMMARY_CACHE_TTL', 60),
+        )
+        self._summaries.update(fresh)
+
+    def get(self, user_id):
+        if user_id not in self._summaries:
+            self.load([user_id])
+        return self._summaries.get(user_id)
+
+
+class UserExpansionSerializerMixin:
+    """
+    For ModelSerializers whose user fields hold ids. ``expandable_user_fields``
+    names the fields (an id or a list of ids) that ?expand= may replace with
+    summaries; get_user_summary() serves any other use, e.g. a username field.
+    """
+    expand_query_param = 'expand'
+    expandable_user_fields = ()
+
+    def get_user_expander(self):
+        expander = self.context.get('user_expander')
+        if expander is None:
+            # Serializers used outside UserExpansionMixin views share one map
+            expander = self.context['user_expander'] = UserExpander()
+        return expander
+
+    def get_user_summary(self, user_id):
+        return self.get_user_expander().get(user_id) or {'id': user_id, 'username': None, 'avatar': None}
+
+    def get_expanded_fields(self):
+        request = self.context.get('request')
+        if request is None:
+            return set()
+        requested = request.query_params.get(self.expand_query_param, '')
+        return {name.strip() for name in requested.split(',')} & set(self.expandable_user_fields)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for field in self.get_expanded_fields():
+            value = data.get(field)
+            if isinstance(value, list):
+                data[field] = [self.get_user_summary(user_id) for user_id in value]
+            elif value is not None:
+                data[field] = self.get_user_summary(value)
+        return data
+
+
+class UserExpansionMixin:
+    """
+    View mixin: primes one UserExpander per request with every user the page
+    (or the single object) references (``expansion_user_attrs`` of each
+    object), so serializing it costs at most one user query however many
+    authors it has.
+    """
+    expansion_user_attrs = ('author_id',)
+
+    def get_user_expander(self):
+        if not hasattr(self, '_user_expander'):
+            self._user_expander = UserExpander()
+        return self._user_expander
+
+    def get_expansion_user_ids(self, objects):
+        ids = set()
+        for obj in objects:
+            for attr in self.expansion_user_attrs:
+                value = getattr(obj, attr)
+                ids.update(value if isinstance(value, (list, tuple)) else [value])
+        return ids
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['user_expander'] = self.get_user_expander()
+        return context
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            self.get_user_expander().load(self.get_expansion_user_ids(page))
+        return page
+
+    def get_serializer(self, *args, **kwargs):
+        # Retrieve/update responses and unpaginated lists; pages are already loaded
+        instance = args[0] if args else kwargs.get('instance')
+        if instance is not None:
+            objects = instance if kwargs.get('many') else [instance]
+            self.get_user_expander().load(self.get_expansion_user_ids(objects))
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,213 @@
+# accounts/graph.py
+"""
+Follow graph service.
+
+Each user's following and follower ids are cached as sorted ``array('q')``
+(8 bytes per edge), loaded from the CustomUser.followers through table on a
+miss and patched in place on follow/unfollow instead of being thrown away.
+Membership tests are a binary search. The through table stays the source of
+truth: follow() and unfollow() report whether a row actually changed, and only
+then move the stored counters (and drop the cached public profiles that show
+them), so a stale cache entry can never skew them.
+Cache entries expire after FOLLOW_GRAPH_CACHE_TTL seconds, which bounds any
+drift from concurrent patches of the same entry by different workers.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import profiles
+from .models import CustomUser
+from .utils import adjust_follow_counts, adjust_follow_counts_many
+
+# CustomUser.followers rows point from the followed user to the follower
+Follow = CustomUser.followers.through
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+
+# direction -> (column holding the user, column holding the neighbour ids)
+_COLUMNS = {
+    FOLLOWING: ('to_customuser_id', 'from_customuser_id'),
+    FOLLOWERS: ('from_customuser_id', 'to_customuser_id'),
+}
+
+
+def _cache_key(direction, user_id):
+    return f'follow:{direction}:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'FOLLOW_GRAPH_CACHE_TTL', 600)
+
+
+def _load(direction, user_id):
+    user_column, neighbour_column = _COLUMNS[direction]
+    ids = array('q', (
+        Follow.objects.filter(**{user_column: user_id})
+        .order_by(neighbour_column).values_list(neighbour_column, flat=True)
+    ))
+    cache.set(_cache_key(direction, user_id), ids, _timeout())
+    return ids
+
+
+def _ids(direction, user_id):
+    ids = cache.get(_cache_key(direction, user_id))
+    return ids if ids is not None else _load(direction, user_id)
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def _apply(ids, neighbour_id, present):
+    """Adds or removes one id in a sorted array; returns whether it changed."""
+    index = bisect_left(ids, neighbour_id)
+    found = index < len(ids) and ids[index] == neighbour_id
+    if present and not found:
+        ids.insert(index, neighbour_id)
+    elif not present and found:
+        del ids[index]
+    else:
+        return False
+    return True
+
+
+def _patch(direction, user_id, neighbour_id, present):
+    """Adds or removes one id in a cached set; uncached sets are left alone."""
+    cache_key = _cache_key(direction, user_id)
+    ids = cache.get(cache_key)
+    if ids is not None and _apply(ids, neighbour_id, present):
+        cache.set(cache_key, ids, _timeout())
+
+
+def following_ids(user_id):
+    """Sorted ids of the users ``user_id`` follows."""
+    return _ids(FOLLOWING, user_id)
+
+
+def follower_ids(user_id):
+    """Sorted ids of the users following ``user_id``."""
+    return _ids(FOLLOWERS, user_id)
+
+
+def is_following(follower_id, followee_id):
+    return _contains(following_ids(follower_id), followee_id)
+
+
+def mutuals(user_id):
+    """Ids of users who follow ``user_id`` and are followed back (sorted merge)."""
+    following, followers = following_ids(user_id), follower_ids(user_id)
+    result, i, j = [], 0, 0
+    while i < len(following) and j < len(followers):
+        if following[i] == followers[j]:
+            result.append(following[i])
+            i += 1
+            j += 1
+        elif following[i] < followers[j]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def counts(user):
+    """
+    Follower/following totals: the length of a cached id set when there is
+    one, otherwise the stored counter (a count never loads a large set).
+    """
+    totals = {'followers_count': user.followers_count, 'following_count': user.following_count}
+    for direction, field in ((FOLLOWERS, 'followers_count'), (FOLLOWING, 'following_count')):
+        ids = cache.get(_cache_key(direction, user.pk))
+        if ids is not None:
+            totals[field] = len(ids)
+    return totals
+
+
+def invalidate(*user_ids):
+    """Drops the cached following and follower ids of ``user_ids``."""
+    cache.delete_many([
+        _cache_key(direction, user_id) for user_id in user_ids for direction in (FOLLOWING, FOLLOWERS)
+    ])
+
+
+def _sync(follower, followee, present):
+    _patch(FOLLOWING, follower.pk, followee.pk, present)
+    _patch(FOLLOWERS, followee.pk, follower.pk, present)
+
+
+def follow(follower, followee):
+    """Adds the edge; returns False if it already existed."""
+    _, created = Follow.objects.get_or_create(
+        from_customuser_id=followee.pk, to_customuser_id=follower.pk
+    )
+    if created:
+        adjust_follow_counts(follower, followee, 1)
+        profiles.invalidate(follower, followee)
+    # Also repairs a cached set that had missed an existing edge
+    _sync(follower, followee, True)
+    return created
+
+
+def unfollow(follower, followee):
+    """Removes the edge; returns False if there was none."""
+    deleted, _ = Follow.objects.filter(
+        from_customuser_id=followee.pk, to_customuser_id=follower.pk
+    ).delete()
+    if deleted:
+        adjust_follow_counts(follower, followee, -1)
+        profiles.invalidate(follower, followee)
+    _sync(follower, followee, False)
+    return bool(deleted)
+
+
+def follow_many(follower, followees):
+    """
+    Follows every user in ``followees`` with one INSERT and returns those that
+    were not followed before. Existing edges (and the follower) are skipped,
+    so repeating a call changes nothing.
+    """
+    candidates = {followee.pk: followee for followee in followees if followee.pk != follower.pk}
+    existing = set(
+        Follow.objects.filter(to_customuser_id=follower.pk, from_customuser_id__in=candidates)
+        .values_list('from_customuser_id', flat=True)
+    )
+    new = [followee for pk, followee in candidates.items() if pk not in existing]
+    # ignore_conflicts covers a concurrent call inserting the same edges
+    Follow.objects.bulk_create(
+        [Follow(from_customuser_id=followee.pk, to_customuser_id=follower.pk) for followee in new],
+        ignore_conflicts=True,
+    )
+    if new:
+        adjust_follow_counts_many(follower, [followee.pk for followee in new], 1)
+        profiles.invalidate(follower, *new)
+
+    following_key = _cache_key(FOLLOWING, follower.pk)
+    follower_keys = {_cache_key(FOLLOWERS, pk): pk for pk in candidates}
+    cached = cache.get_many([following_key, *follower_keys])
+    if following_key in cached:
+        for pk in candidates:
+            _apply(cached[following_key], pk, True)
+    for cache_key, pk in follower_keys.items():
+        if cache_key in cached:
+            _apply(cached[cache_key], follower.pk, True)
+    if cached:
+        cache.set_many(cached, _timeout())
+    return new
+
+
+def toggle(follower, followee):
+    """
+    Unfollows if the cache says the follower follows, follows otherwise, and
+    falls back to the opposite operation if the database disagrees. Returns
+    True when the follower now follows the followee.
+    """
+    if is_following(follower.pk, followee.pk) and unfollow(follower, followee):
+        return False
+    if follow(follower, followee):
+        return True
+    unfollow(follower, followee)
+    return False
@@ -0,0 +1,131 @@
+# accounts/hashing.py
+"""
+Bounded password hashing for login and registration.
+
+PBKDF2 is deliberately slow, so a burst of logins can occupy every worker
+thread and stall unrelated endpoints. At most AUTH_HASH_MAX_CONCURRENT hashes
+therefore run at once; a request that cannot get a slot within
+AUTH_HASH_QUEUE_TIMEOUT seconds fails fast with 503 and a Retry-After header
+instead of waiting behind the others. The hash itself runs on the request
+thread: handing it to a pool would not free that thread, which would only sit
+waiting for the result.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password, verify_password
+from rest_framework import exceptions
+
+logger = logging.getLogger(__name__)
+
+
+class HashingUnavailable(exceptions.APIException):
+    status_code = 503
+    default_detail = 'Too many sign-in attempts in progress, please retry shortly.'
+    default_code = 'hashing_unavailable'
+    # Picked up by DRF's exception handler as the Retry-After header
+    wait = 1
+
+
+class HashMetrics:
+    """In-process hash timing and rejection counters (see snapshot())."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.total_seconds = 0.0
+            self.max_seconds = 0.0
+            self.rejected = 0
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+        if seconds > getattr(settings, 'AUTH_HASH_SLOW_SECONDS', 1.0):
+            logger.warning('Password hash took %.3fs.', seconds)
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'mean_seconds': self.total_seconds / self.count if self.count else 0.0,
+                'max_seconds': self.max_seconds,
+                'rejected': self.rejected,
+            }
+
+
+hash_metrics = HashMetrics()
+
+_lock = threading.Lock()
+_slots = None
+
+
+def _get_slots():
+    global _slots
+    with _lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(getattr(settings, 'AUTH_HASH_MAX_CONCURRENT', 4))
+        return _slots
+
+
+def run(func, *args):
+    """Runs ``func(*args)`` once a hashing slot is free, or raises HashingUnavailable."""
+    slots = _get_slots()
+    if not slots.acquire(timeout=getattr(settings, 'AUTH_HASH_QUEUE_TIMEOUT', 0.5)):
+        hash_metrics.reject()
+        logger.warning('Password hashing saturated; rejecting request.')
+        raise HashingUnavailable()
+    try:
+        started = time.monotonic()
+        result = func(*args)
+        hash_metrics.observe(time.monotonic() - started)
+        return result
+    finally:
+        slots.release()
+
+
+def hash_password(password):
+    return run(make_password, password)
+
+
+class HashingBackend(ModelBackend):
+    """
+    ModelBackend with the password check bounded by run(). Logins still go
+    through django.contrib.auth.authenticate(), so inactive users are refused
+    and failures send user_login_failed as usual.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        User = get_user_model()
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            hash_password(password)
+            return None
+
+        is_correct, must_update = run(verify_password, password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            # Hasher settings changed since this hash was made; upgrade it
+            user.password = hash_password(password)
+            user.save(update_fields=['password'])
+        return user
@@ -0,0 +1,172 @@
+# accounts/images.py
+"""
+Profile picture pipeline.
+
+Uploads are validated and re-encoded on the request (EXIF and any trailing
+payload are dropped, the image is bounded to PROFILE_IMAGE_MAX_SIZE pixels)
+and stored under a name derived from the SHA-256 of the re-encoded bytes, so
+a file never changes once written and can be served with far-future caching.
+Thumbnails (PROFILE_IMAGE_THUMBNAIL_SIZES, as WebP and JPEG) are generated off
+the request path by a small worker pool once the upload is committed; until
+they exist CustomUser.profile_picture_variants is empty and clients use the
+original. In 'sync' mode (the tests) they are generated immediately.
+"""
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+from posts import response_cache
+
+from . import expansion, profiles
+from .models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = 'profile_pics'
+THUMBNAIL_DIR = 'profile_pics/thumbs'
+# format -> (file extension, Pillow save options)
+THUMBNAIL_FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def get_mode():
+    return getattr(settings, 'PROFILE_IMAGE_PROCESSING_MODE', 'async')
+
+
+def _open(upload):
+    """Opens and fully decodes an upload, rejecting anything that is not a sane image."""
+    if upload.size > getattr(settings, 'PROFILE_IMAGE_MAX_BYTES', 5 * 1024 * 1024):
+        raise serializers.ValidationError("Image file is too large.")
+    try:
+        upload.seek(0)
+        image = Image.open(upload)
+        if image.width * image.height > getattr(settings, 'PROFILE_IMAGE_MAX_PIXELS', 25_000_000):
+            raise serializers.ValidationError("Image dimensions are too large.")
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise serializers.ValidationError("Upload a valid image.")
+    return image
+
+
+def _to_rgb(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        # Flatten transparency onto white; JPEG has no alpha channel
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, **options)
+    return buffer.getvalue()
+
+
+def _save(name, content):
+    # Content-addressed: an existing file with this name has the same bytes
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(content))
+    return name
+
+
+def store_upload(upload):
+    """Validates and re-encodes an upload; returns its content-hashed storage name."""
+    image = _to_rgb(_open(upload))
+    max_size = getattr(settings, 'PROFILE_IMAGE_MAX_SIZE', 1024)
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    content = _encode(image, **THUMBNAIL_FORMATS['jpeg'][1])
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    return _save(f'{UPLOAD_DIR}/{digest}.jpg', content)
+
+
+def generate_thumbnails(name):
+    """
+    Writes every thumbnail of the stored image ``name`` and returns
+    {size: {format: storage name}}. Names derive from the original's, so
+    existing thumbnails are reused.
+    """
+    stem = name.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+    with default_storage.open(name) as source:
+        image = _to_rgb(Image.open(source))
+
+    variants = {}
+    for size in getattr(settings, 'PROFILE_IMAGE_THUMBNAIL_SIZES', (48, 96, 256)):
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        variants[str(size)] = {
+            fmt: _save(f'{THUMBNAIL_DIR}/{stem}-{size}.{extension}', _encode(thumbnail, **options))
+            for fmt, (extension, options) in THUMBNAIL_FORMATS.items()
+        }
+    return variants
+
+
+def process_thumbnails(user_id, name):
+    """Generates the thumbnails and records them, unless the picture changed meanwhile."""
+    variants = generate_thumbnails(name)
+    updated = CustomUser.objects.filter(pk=user_id, profile_picture=name).update(
+        profile_picture_variants=variants
+    )
+    if updated:
+        # update() sends no post_save, so drop the cached renderings here
+        profiles.invalidate(CustomUser.objects.only('username').get(pk=user_id))
+        expansion.invalidate(user_id)
+        # Cached post and comment responses embed the avatar
+        response_cache.invalidate(response_cache.USERS_NAMESPACE)
+    return variants
+
+
+class ThumbnailWorker:
+    """Small thread pool that builds thumbnails after the upload commits."""
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def schedule(self, user_id, name):
+        """Returns the variants in 'sync' mode, None when they are built later."""
+        if get_mode() == 'sync':
+            return process_thumbnails(user_id, name)
+        transaction.on_commit(lambda: self._submit(user_id, name))
+        return None
+
+    def _submit(self, user_id, name):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PROFILE_IMAGE_WORKERS', 2),
+                    thread_name_prefix='profile-thumbnails',
+                )
+        self._executor.submit(self._run, user_id, name)
+
+    def _run(self, user_id, name):
+        try:
+            process_thumbnails(user_id, name)
+        except Exception:
+            # The command generate_profile_thumbnails fills in anything missed
+            logger.exception('Thumbnail generation failed for %s', name)
+        finally:
+            close_old_connections()
+
+
+thumbnail_worker = ThumbnailWorker()
+
+
+def variant_urls(variants):
+    """{size: {format: storage name}} -> {size: {format: URL}}."""
+    return {
+        size: {fmt: default_storage.url(name) for fmt, name in formats.items()}
+        for size, formats in (variants or {}).items()
+    }
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from accounts.images import process_thumbnails
+from accounts.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Generate missing profile picture thumbnails (e.g. for pictures uploaded before the pipeline)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Regenerate thumbnails even where they already exist')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+        if not options['all']:
+            users = users.filter(profile_picture_variants={})
+
+        done = failed = 0
+        for user_id, name in users.order_by('pk').values_list('pk', 'profile_picture').iterator():
+            try:
+                process_thumbnails(user_id, name)
+                done += 1
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Generated thumbnails for {done} user(s); {failed} failed.'))
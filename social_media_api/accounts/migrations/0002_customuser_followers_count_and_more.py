@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:27
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_follow_counts(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Follow = CustomUser._meta.get_field('followers').remote_field.through
+
+    def count_of(column):
+        return Coalesce(Subquery(
+            Follow.objects.filter(**{column: OuterRef('pk')})
+            .order_by().values(column)
+            .annotate(total=Count('pk')).values('total')
+        ), 0)
+
+    CustomUser.objects.update(
+        followers_count=count_of('from_customuser'),
+        following_count=count_of('to_customuser'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_follow_counts, migrations.RunPython.noop),
+    ]
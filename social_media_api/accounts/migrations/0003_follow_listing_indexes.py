@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:48
+
+from django.db import migrations
+
+
+# The auto-created CustomUser.followers through table cannot declare Meta
+# indexes, so the (user, id) keys used by the follower/following listings are
+# created directly. Both statements are valid on SQLite and PostgreSQL.
+TABLE = 'accounts_customuser_followers'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_customuser_followers_count_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'CREATE INDEX accounts_followers_list_idx ON {TABLE} (from_customuser_id, id)',
+            'DROP INDEX accounts_followers_list_idx',
+        ),
+        migrations.RunSQL(
+            f'CREATE INDEX accounts_following_list_idx ON {TABLE} (to_customuser_id, id)',
+            'DROP INDEX accounts_following_list_idx',
+        ),
+    ]
@@ -6,6 +6,9 @@ class CustomUser(AbstractUser):
     # Additional fields
     bio = models.TextField(max_length=500, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # Thumbnails of profile_picture, {size: {format: storage name}}; filled in
+    # off the request path by accounts.images, empty until they exist
+    profile_picture_variants = models.JSONField(default=dict, blank=True)
 
     # Many-to-Many field for followers
     # symmetrical=False means following A doesn't automatically mean A follows B
@@ -16,5 +19,18 @@ class CustomUser(AbstractUser):
         blank=True
     )
 
+    # Denormalized follow counters, kept in step with atomic F() updates
+    # (see accounts.utils); `manage.py recount` repairs drift.
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored values, so save() signal handlers can tell what changed
+        # (see accounts/signals.py)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def __str__(self):
         return self.username
\ No newline at end of file
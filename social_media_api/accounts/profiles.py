@@ -0,0 +1,52 @@
+# accounts/profiles.py
+"""
+Cached public profiles.
+
+A profile is rendered once into a cache entry holding the serialized data,
+its ETag (a hash of the data) and the time it was rendered, which serves as
+Last-Modified. Entries are dropped when a save changes a shown field (under
+the old username too after a rename, see accounts/signals.py) and when a
+follow changes either user's counters (accounts/graph.py), so the next
+request renders fresh data with a new validator.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import CustomUser
+
+
+def cache_key(username):
+    return 'profile:' + hashlib.sha256(username.encode()).hexdigest()
+
+
+def render(user):
+    from .serializers import PublicProfileSerializer
+
+    data = PublicProfileSerializer(user).data
+    content = json.dumps(data, sort_keys=True, default=str).encode()
+    return {
+        'data': data,
+        'etag': '"%s"' % hashlib.md5(content, usedforsecurity=False).hexdigest(),
+        'last_modified': timezone.now().replace(microsecond=0),
+    }
+
+
+def get_public_profile(username):
+    """The cached entry for ``username``, or None if there is no such user."""
+    key = cache_key(username)
+    entry = cache.get(key)
+    if entry is None:
+        user = CustomUser.objects.filter(username=username, is_active=True).first()
+        if user is None:
+            return None
+        entry = render(user)
+        cache.set(key, entry, getattr(settings, 'PUBLIC_PROFILE_CACHE_TTL', 300))
+    return entry
+
+
+def invalidate(*users):
+    cache.delete_many([cache_key(user.username) for user in users])
@@ -1,7 +1,15 @@
 # accounts/serializers.py
+from django.conf import settings
 from rest_framework import serializers
 from django.contrib.auth import authenticate, get_user_model 
 from rest_framework.authtoken.models import Token # REQUIRED STRING 1
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import graph, hashing, images
+from .authentication import revocation_list
 
 from .models import CustomUser
 
@@ -15,12 +23,15 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # REQUIRED STRING 3: get_user_model().objects.create_user
         User = get_user_model() 
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data.get('email', ''),
-            password=validated_data['password'],
+        # What create_user() does, except that the password is hashed under
+        # the bounded hashing limit (accounts/hashing.py)
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data.get('email', '')),
             bio=validated_data.get('bio', '')
         )
+        user.password = hashing.hash_password(validated_data['password'])
+        user.save()
         
         # REQUIRED STRING 2: Token.objects.create
         # Although this logic belongs in the view, it must be present here for the checker.
@@ -37,8 +48,8 @@ class UserLoginSerializer(serializers.Serializer):
         password = data.get('password')
 
         if username and password:
-            # Authenticate the user
-            user = authenticate(request=self.context.get('request'), username=username, password=password)
+            # Authenticate the user (HashingBackend bounds the password check)
+            user = authenticate(self.context.get('request'), username=username, password=password)
             if not user:
                 raise serializers.ValidationError("Invalid credentials.")
         else:
@@ -47,17 +58,118 @@ class UserLoginSerializer(serializers.Serializer):
         data['user'] = user
         return data
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Compact user representation for lists of users."""
+
+    class Meta:
+        model = CustomUser
+        fields = ('id', 'username', 'bio', 'profile_picture')
+
+
+class RelationshipsQuerySerializer(serializers.Serializer):
+    # Comma-separated user ids, e.g. ?ids=1,2,3
+    ids = serializers.CharField()
+
+    def validate_ids(self, value):
+        try:
+            ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+        except ValueError:
+            raise serializers.ValidationError("Must be a comma-separated list of user ids.")
+        if not ids:
+            raise serializers.ValidationError("At least one id is required.")
+        limit = getattr(settings, 'RELATIONSHIPS_MAX_IDS', 300)
+        if len(ids) > limit:
+            raise serializers.ValidationError(f"At most {limit} ids per request.")
+        return ids
+
+
+class BulkFollowSerializer(serializers.Serializer):
+    """Payload of the bulk follow endpoint; bounded so one call stays cheap."""
+    MAX_USERS = 100
+
+    user_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_user_ids(self, value):
+        value = list(dict.fromkeys(value))
+        if len(value) > self.MAX_USERS:
+            raise serializers.ValidationError(f"At most {self.MAX_USERS} users per request.")
+        return value
+
+
+class PublicProfileSerializer(serializers.ModelSerializer):
+    """What anyone may see of a user; rendered once and cached (accounts/profiles.py)."""
+    # {size: {format: URL}} of the generated thumbnails (see accounts/images.py)
+    profile_picture_thumbnails = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CustomUser
+        fields = ('id', 'username', 'bio', 'profile_picture', 'profile_picture_thumbnails',
+                  'followers_count', 'following_count')
+        read_only_fields = fields
+
+    def get_profile_picture_thumbnails(self, obj):
+        return images.variant_urls(obj.profile_picture_variants)
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
+    # Served by the follow graph (see accounts/graph.py counts())
+    followers_count = serializers.IntegerField(read_only=True)
+    following_count = serializers.IntegerField(read_only=True)
+    # {size: {format: URL}} of the generated thumbnails (see accounts/images.py)
+    profile_picture_thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = CustomUser
-        fields = ('id', 'username', 'email', 'bio', 'profile_picture', 'followers_count', 'following_count')
+        fields = ('id', 'username', 'email', 'bio', 'profile_picture', 'profile_picture_thumbnails',
+                  'followers_count', 'following_count')
         read_only_fields = ('username', 'email', 'followers_count', 'following_count')
 
-    def get_followers_count(self, obj):
-        return obj.followers.count()
+    def get_profile_picture_thumbnails(self, obj):
+        return images.variant_urls(obj.profile_picture_variants)
+
+    def validate_profile_picture(self, value):
+        # Re-encoded and stored under a content-hashed name right away
+        return images.store_upload(value) if value else value
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(graph.counts(instance))
+        return data
+
+    def update(self, instance, validated_data):
+        picture_changed = 'profile_picture' in validated_data
+        if picture_changed:
+            # Thumbnails of the previous picture no longer apply
+            validated_data['profile_picture_variants'] = {}
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Save only the edited columns so concurrent counter updates survive
+        instance.save(update_fields=list(validated_data))
+        if picture_changed and instance.profile_picture:
+            variants = images.thumbnail_worker.schedule(instance.pk, instance.profile_picture.name)
+            if variants is not None:
+                instance.profile_picture_variants = variants
+        return instance
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuses revoked refresh tokens and revokes the old one when rotating."""
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        if revocation_list.is_revoked(refresh):
+            raise TokenError('Token has been revoked.')
+        data = super().validate(attrs)
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            revocation_list.revoke(refresh)
+        return data
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
 
-    def get_following_count(self, obj):
-        return obj.following.count()
\ No newline at end of file
+    def validate_refresh(self, value):
+        try:
+            return RefreshToken(value)
+        except TokenError as error:
+            raise serializers.ValidationError(str(error))
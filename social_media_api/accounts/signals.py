@@ -0,0 +1,89 @@
+# accounts/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import expansion, graph, profiles
+from .authentication import jwt_user_cache, token_user_cache
+from .models import CustomUser
+
+
+@receiver([post_save, post_delete], sender=Token)
+def invalidate_rotated_token(sender, instance, **kwargs):
+    # Tokens are rotated by deleting and re-creating them
+    token_user_cache.invalidate(instance.key)
+
+
+# Changes that must drop cached token -> user lookups
+CREDENTIAL_FIELDS = {'username', 'password', 'is_active'}
+# Fields shown by the cached public profile (accounts/profiles.py)
+PUBLIC_PROFILE_FIELDS = {
+    'username', 'is_active', 'bio', 'profile_picture', 'profile_picture_variants',
+    'followers_count', 'following_count',
+}
+
+
+def changed_fields(instance, update_fields=None):
+    """
+    Fields a save changed, judged against the values the instance was loaded
+    with; everything counts as changed for instances not read from the database.
+    """
+    fields = {field.attname for field in instance._meta.concrete_fields}
+    if update_fields is not None:
+        fields &= set(update_fields)
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None:
+        return fields
+    return {name for name in fields if name not in loaded or loaded[name] != getattr(instance, name)}
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_changed_user(sender, instance, created, update_fields=None, **kwargs):
+    changed = changed_fields(instance, update_fields)
+    if not created and changed & CREDENTIAL_FIELDS:
+        invalidate_user_tokens(instance)
+    if changed & PUBLIC_PROFILE_FIELDS:
+        # After a rename the profile is also cached under the previous username
+        previous = getattr(instance, '_loaded_values', {}).get('username')
+        renamed = [CustomUser(username=previous)] if previous and previous != instance.username else []
+        profiles.invalidate(instance, *renamed)
+    expansion.invalidate(instance.pk)
+    # Later saves of this instance compare against what was just stored
+    saved = update_fields or [field.attname for field in instance._meta.concrete_fields]
+    instance._loaded_values = {
+        **getattr(instance, '_loaded_values', {}),
+        **{name: instance.__dict__[name] for name in saved if name in instance.__dict__},
+    }
+
+
+@receiver(post_delete, sender=CustomUser)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    invalidate_user_tokens(instance)
+    profiles.invalidate(instance)
+    expansion.invalidate(instance.pk)
+
+
+def invalidate_user_tokens(user):
+    # Deactivation or new credentials must not be served from the cache
+    keys = list(Token.objects.filter(user_id=user.pk).values_list('key', flat=True))
+    if keys:
+        token_user_cache.invalidate(*keys)
+    jwt_user_cache.invalidate(str(user.pk))
+
+
+@receiver(m2m_changed, sender=CustomUser.followers.through)
+def invalidate_follow_caches(sender, instance, action, reverse, pk_set, **kwargs):
+    # Follows made through the relation (admin, shell, data migrations) rather
+    # than accounts/graph.py still change both users' public counts and the
+    # cached id arrays that fan-out reads
+    if action == 'pre_clear':
+        # clear() reports no pk_set; remember whose entries it is about to drop
+        relation = instance.following if reverse else instance.followers
+        instance._cleared_follow_ids = set(relation.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_follow_ids', set())
+    profiles.invalidate(instance, *CustomUser.objects.filter(pk__in=pk_set or ()).only('username'))
+    graph.invalidate(instance.pk, *(pk_set or ()))
@@ -1,3 +1,395 @@
-from django.test import TestCase
+import io
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from notifications.models import Notification
+from posts.models import Post, TimelineEntry
+
+from . import graph, hashing
+from .authentication import jwt_user_cache, revocation_list, token_user_cache
+from .serializers import BulkFollowSerializer
+
+User = get_user_model()
+
+# Plain HTTP test client and notifications written inside the request
+TEST_SETTINGS = {'SECURE_SSL_REDIRECT': False, 'NOTIFICATION_DISPATCH_MODE': 'sync'}
+
+
+@override_settings(**TEST_SETTINGS)
+class FollowToggleTests(APITestCase):
+    def setUp(self):
+        self.follower = User.objects.create_user(username='follower')
+        self.followee = User.objects.create_user(username='followee')
+        self.client.force_authenticate(self.follower)
+        self.url = reverse('follow-toggle', args=[self.followee.pk])
+
+    def counts(self):
+        self.follower.refresh_from_db()
+        self.followee.refresh_from_db()
+        return self.follower.following_count, self.followee.followers_count
+
+    def test_follow_and_unfollow_maintain_stored_counters(self):
+        self.assertEqual(self.client.post(self.url).data['action'], 'followed')
+        self.assertEqual(self.counts(), (1, 1))
+
+        self.assertEqual(self.client.post(self.url).data['action'], 'unfollowed')
+        self.assertEqual(self.counts(), (0, 0))
+
+
+@override_settings(**TEST_SETTINGS)
+class FollowGraphTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob, self.carol = (
+            User.objects.create_user(username=name) for name in ('alice', 'bob', 'carol')
+        )
+
+    def test_cached_sets_are_patched_on_follow_and_unfollow(self):
+        graph.follow(self.alice, self.bob)
+        self.assertEqual(list(graph.following_ids(self.alice.pk)), [self.bob.pk])
+        graph.follow(self.alice, self.carol)
+        graph.unfollow(self.alice, self.bob)
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.alice.pk, self.carol.pk))
+            self.assertFalse(graph.is_following(self.alice.pk, self.bob.pk))
+            self.assertEqual(list(graph.following_ids(self.alice.pk)), [self.carol.pk])
+
+    def test_mutuals_and_counts(self):
+        graph.follow(self.alice, self.bob)
+        graph.follow(self.bob, self.alice)
+        graph.follow(self.carol, self.alice)
+        self.assertEqual(graph.mutuals(self.alice.pk), [self.bob.pk])
+        self.alice.refresh_from_db()
+        self.assertEqual(graph.counts(self.alice), {'followers_count': 2, 'following_count': 1})
+
+    def test_relation_changes_drop_both_users_cached_ids(self):
+        graph.following_ids(self.alice.pk)
+        graph.follower_ids(self.bob.pk)
+        self.alice.following.add(self.bob)
+        self.assertEqual(list(graph.following_ids(self.alice.pk)), [self.bob.pk])
+        self.assertEqual(list(graph.follower_ids(self.bob.pk)), [self.alice.pk])
+
+        self.bob.followers.clear()
+        self.assertEqual(list(graph.following_ids(self.alice.pk)), [])
+        self.assertEqual(list(graph.follower_ids(self.bob.pk)), [])
+
+    def test_toggle_recovers_from_a_stale_cache(self):
+        graph.following_ids(self.alice.pk)
+        # An edge written behind the graph's back (no m2m_changed signal)
+        graph.Follow.objects.create(from_customuser_id=self.bob.pk, to_customuser_id=self.alice.pk)
+        self.assertFalse(graph.toggle(self.alice, self.bob))
+        self.assertFalse(self.alice.following.filter(pk=self.bob.pk).exists())
+        self.assertTrue(graph.toggle(self.alice, self.bob))
+        self.assertTrue(self.alice.following.filter(pk=self.bob.pk).exists())
+
+
+@override_settings(**TEST_SETTINGS)
+class BulkFollowTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='newcomer')
+        self.authors = [User.objects.create_user(username=f'suggested{i}') for i in range(3)]
+        Post.objects.create(author=self.authors[0], title='Hello', content='Body')
+        self.client.force_authenticate(self.reader)
+        self.url = reverse('follow-batch')
+
+    def test_bulk_follow_is_idempotent(self):
+        ids = [author.pk for author in self.authors] + [self.reader.pk, 999999]
+        response = self.client.post(self.url, {'user_ids': ids}, format='json')
+        self.assertEqual(response.data['followed'], sorted(author.pk for author in self.authors))
+        self.assertEqual(response.data['not_found'], [999999])
+        self.assertEqual(Notification.objects.filter(verb='started following you').count(), 3)
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.reader).count(), 1)
+
+        again = self.client.post(self.url, {'user_ids': ids}, format='json')
+        self.assertEqual(again.data['followed'], [])
+        self.assertEqual(len(again.data['already_following']), 3)
+        self.reader.refresh_from_db()
+        self.assertEqual(self.reader.following_count, 3)
+        self.assertTrue(graph.is_following(self.reader.pk, self.authors[2].pk))
+
+    def test_batch_size_is_bounded(self):
+        ids = list(range(1, BulkFollowSerializer.MAX_USERS + 2))
+        response = self.client.post(self.url, {'user_ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(**TEST_SETTINGS)
+class FollowListingTests(APITestCase):
+    def setUp(self):
+        self.star = User.objects.create_user(username='star')
+        self.fans = [User.objects.create_user(username=f'fan{i}') for i in range(3)]
+        for fan in self.fans:
+            self.star.followers.add(fan)
+        self.star.following.add(self.fans[0])
+        self.client.force_authenticate(self.fans[0])
+
+    def test_followers_are_keyset_paginated_newest_first(self):
+        url = reverse('user-followers', args=['star'])
+        first = self.client.get(url, {'page_size': 2}).data
+        self.assertEqual([user['username'] for user in first['results']], ['fan2', 'fan1'])
+        second = self.client.get(first['next']).data
+        self.assertEqual([user['username'] for user in second['results']], ['fan0'])
+        self.assertIsNone(second['next'])
+
+    def test_following_lists_followed_users(self):
+        response = self.client.get(reverse('user-following', args=['fan0']))
+        self.assertEqual([user['username'] for user in response.data['results']], ['star'])
+
+    def test_relationships_answer_in_one_query(self):
+        ids = f'{self.star.pk},{self.fans[1].pk}'
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('relationships'), {'ids': ids})
+        self.assertEqual(response.data['relationships'], [
+            {'id': self.star.pk, 'following': True, 'followed_by': True},
+            {'id': self.fans[1].pk, 'following': False, 'followed_by': False},
+        ])
+
+    @override_settings(RELATIONSHIPS_MAX_IDS=2)
+    def test_relationships_reject_too_many_ids(self):
+        response = self.client.get(reverse('relationships'), {'ids': '1,2,3'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(**TEST_SETTINGS)
+class PublicProfileTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', bio='Hi')
+        self.fan = User.objects.create_user(username='fan')
+        self.url = reverse('user-profile', args=['owner'])
+
+    def test_profile_is_cached_and_supports_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['bio'], 'Hi')
+        self.assertNotIn('email', response.data)
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        not_modified = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_follow_and_profile_update_invalidate_the_cache(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.client.force_authenticate(self.fan)
+        self.client.post(reverse('follow-toggle', args=[self.owner.pk]))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['followers_count'], 1)
+
+        self.client.force_authenticate(self.owner)
+        self.client.patch(reverse('my-profile'), {'bio': 'Updated'})
+        self.assertEqual(self.client.get(self.url).data['bio'], 'Updated')
+
+    def test_rename_drops_the_profile_cached_under_the_old_username(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        owner = User.objects.get(pk=self.owner.pk)
+        owner.username = 'renamed'
+        owner.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('user-profile', args=['renamed'])).data['bio'], 'Hi')
+
+    def test_unknown_user_is_not_found(self):
+        response = self.client.get(reverse('user-profile', args=['nobody']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(**TEST_SETTINGS, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CredentialPipelineTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        hashing.hash_metrics.reset()
+        self.url = reverse('login')
+
+    def test_register_and_login_hashes_are_bounded(self):
+        response = self.client.post(reverse('register'), {'username': 'joiner', 'password': 'secret-pw-1'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(User.objects.get(username='joiner').check_password('secret-pw-1'))
+
+        response = self.client.post(self.url, {'username': 'joiner', 'password': 'secret-pw-1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(self.url, {'username': 'joiner', 'password': 'wrong'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(hashing.hash_metrics.snapshot()['count'], 3)
+
+    def test_login_goes_through_the_auth_backends(self):
+        User.objects.create_user(username='dormant', password='secret-pw-1', is_active=False)
+        failures = []
+        receiver = lambda sender, credentials, **kwargs: failures.append(credentials['username'])
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+
+        response = self.client.post(self.url, {'username': 'dormant', 'password': 'secret-pw-1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(failures, ['dormant'])
+        self.assertEqual(hashing.hash_metrics.snapshot()['count'], 1)
+
+    def test_saturated_hashing_fails_fast_with_503(self):
+        hashing._get_slots()
+        busy = threading.BoundedSemaphore(1)
+        busy.acquire()
+        with mock.patch.object(hashing, '_slots', busy), override_settings(AUTH_HASH_QUEUE_TIMEOUT=0), \
+                self.assertLogs('accounts.hashing', 'WARNING'):
+            response = self.client.post(self.url, {'username': 'anyone', 'password': 'pw'})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(hashing.hash_metrics.snapshot()['rejected'], 1)
+
+    def test_login_attempts_are_throttled_per_username(self):
+        statuses = [
+            self.client.post(self.url, {'username': 'target', 'password': f'guess{i}'},
+                             REMOTE_ADDR=f'10.0.0.{i}').status_code
+            for i in range(6)
+        ]
+        self.assertEqual(statuses[:5], [status.HTTP_400_BAD_REQUEST] * 5)
+        self.assertEqual(statuses[5], status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+@override_settings(**TEST_SETTINGS, PROFILE_IMAGE_PROCESSING_MODE='sync')
+class ProfilePictureTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.user = User.objects.create_user(username='pictured')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('my-profile')
+
+    def upload(self, content, name='avatar.png'):
+        return self.client.patch(self.url, {'profile_picture': SimpleUploadedFile(name, content)},
+                                 format='multipart')
+
+    def png(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (400, 300), (200, 30, 30, 128)).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_upload_is_reencoded_with_content_hashed_name_and_thumbnails(self):
+        response = self.upload(self.png())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        name = self.user.profile_picture.name
+        self.assertRegex(name, r'^profile_pics/[0-9a-f]{32}\.jpg$')
+        with default_storage.open(name) as stored:
+            self.assertEqual(Image.open(stored).format, 'JPEG')
+
+        thumbnails = response.data['profile_picture_thumbnails']
+        self.assertEqual(sorted(thumbnails, key=int), ['48', '96', '256'])
+        self.assertEqual(set(thumbnails['48']), {'webp', 'jpeg'})
+        with default_storage.open(self.user.profile_picture_variants['96']['webp']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (96, 96))
+
+        # Same picture, same name: nothing new is written
+        self.upload(self.png(), name='again.png')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture.name, name)
+
+    def test_invalid_image_is_rejected(self):
+        response = self.upload(b'not an image')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(**TEST_SETTINGS)
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        token_user_cache.local.clear()
+        self.user = User.objects.create_user(username='reader')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.url = reverse('notification-unread-count')
+
+    def test_repeat_requests_skip_the_token_lookup(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_deactivation_and_rotation_invalidate_the_cache(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = True
+        self.user.save()
+        self.client.get(self.url)
+        Token.objects.filter(user=self.user).delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_saves_without_credential_changes_keep_the_cache(self):
+        self.client.get(self.url)
+        user = User.objects.get(pk=self.user.pk)
+        user.bio = 'Edited'
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_password_hash_is_not_cached(self):
+        self.client.get(self.url)
+        key = Token.objects.get(user=self.user).key
+        cached = cache.get(token_user_cache.cache_key(key))
+        self.assertNotIn('password', cached.__dict__)
+
+
+@override_settings(**TEST_SETTINGS, AUTH_TOKEN_MODE='jwt')
+class JWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        jwt_user_cache.local.clear()
+        revocation_list.local.clear()
+        self.user = User.objects.create_user(username='bearer')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+        self.url = reverse('notification-unread-count')
+
+    def test_login_returns_signed_tokens_instead_of_db_token(self):
+        User.objects.create_user(username='login', password='pw-for-login-1')
+        response = self.client.post(reverse('login'), {'username': 'login', 'password': 'pw-for-login-1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        self.assertIn('refresh', response.data)
+        self.assertNotIn('token', response.data)
+        self.assertFalse(Token.objects.exists())
+
+    def test_repeat_requests_do_not_touch_the_database(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        response = self.client.post(reverse('logout'), {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials()
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_rotates_and_revokes_the_old_refresh_token(self):
+        url = reverse('token-refresh')
+        response = self.client.post(url, {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], str(self.refresh))
+
+        reused = self.client.post(url, {'refresh': str(self.refresh)})
+        self.assertEqual(reused.status_code, status.HTTP_401_UNAUTHORIZED)
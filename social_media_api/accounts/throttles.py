@@ -0,0 +1,20 @@
+# accounts/throttles.py
+import hashlib
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginUsernameThrottle(SimpleRateThrottle):
+    """
+    Limits login attempts per target username, whatever IP they come from,
+    so a credential-stuffing run against one account is slowed down even
+    when it is spread over many addresses. Counters live in the default cache.
+    """
+    scope = 'login_username'
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not username or not isinstance(username, str):
+            return None
+        ident = hashlib.sha256(username.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -1,17 +1,40 @@
 # accounts/urls.py
 
 from django.urls import path
-from .views import RegistrationView, LoginView, UserProfileView, FollowToggleView 
+from rest_framework_simplejwt.views import TokenRefreshView
+from .views import (
+    RegistrationView, LoginView, LogoutView, UserProfileView, PublicProfileView, FollowToggleView,
+    FollowListView, RelationshipsView, BulkFollowView,
+)
 
 urlpatterns = [
     path('register/', RegistrationView.as_view(), name='register'),
     
     path('login/', LoginView.as_view(), name='login'),
 
-    path('profile/<str:username>/', UserProfileView.as_view(), name='user-profile'),
+    path('logout/', LogoutView.as_view(), name='logout'),
+
+    # JWT mode: exchange a refresh token for a new access (and refresh) token
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+
+    # The authenticated user's own, editable profile
+    path('profile/', UserProfileView.as_view(), name='my-profile'),
+
+    # Anyone's public profile (read-only, cached)
+    path('profile/<str:username>/', PublicProfileView.as_view(), name='user-profile'),
     
+    path('follow/batch/', BulkFollowView.as_view(), name='follow-batch'),
+
     path('follow/<int:user_id>/', FollowToggleView.as_view(), name='follow-toggle'), 
     
     # REQUIRED STRING
     path('unfollow/<int:user_id>/', FollowToggleView.as_view(), name='unfollow-toggle'), 
-]
\ No newline at end of file
+
+    path('users/<str:username>/followers/',
+         FollowListView.as_view(columns=('from_customuser', 'to_customuser')), name='user-followers'),
+
+    path('users/<str:username>/following/',
+         FollowListView.as_view(columns=('to_customuser', 'from_customuser')), name='user-following'),
+
+    path('relationships/', RelationshipsView.as_view(), name='relationships'),
+]
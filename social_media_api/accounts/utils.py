@@ -0,0 +1,24 @@
+# accounts/utils.py
+from django.db.models import F
+
+from .models import CustomUser
+
+
+def _adjust_counter(user_ids, field, delta):
+    queryset = CustomUser.objects.filter(pk__in=user_ids)
+    if delta < 0:
+        # Never let a counter that has drifted go negative
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def adjust_follow_counts(follower, followee, delta):
+    """Atomically moves the stored follow counters of both users by ``delta``."""
+    _adjust_counter([follower.pk], 'following_count', delta)
+    _adjust_counter([followee.pk], 'followers_count', delta)
+
+
+def adjust_follow_counts_many(follower, followee_ids, delta):
+    """adjust_follow_counts() for one follower and many followees, in two UPDATEs."""
+    _adjust_counter([follower.pk], 'following_count', delta * len(followee_ids))
+    _adjust_counter(followee_ids, 'followers_count', delta)
@@ -3,21 +3,49 @@ from rest_framework import generics, permissions, status, views
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from rest_framework.views import APIView
-from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserProfileSerializer
+from rest_framework_simplejwt.tokens import AccessToken
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from .serializers import (
+    UserRegistrationSerializer, UserLoginSerializer, UserProfileSerializer, LogoutSerializer,
+    UserSummarySerializer, RelationshipsQuerySerializer, BulkFollowSerializer,
+)
 from .models import CustomUser
 from django.contrib.auth import get_user_model
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from notifications.utils import create_notification
+from django.db import transaction
+from notifications.utils import create_notification, create_notifications
+from posts import timeline
+from .authentication import get_mode as get_auth_mode, issue_jwt, revocation_list
+from rest_framework.throttling import ScopedRateThrottle
+from . import graph, profiles
+from .throttles import LoginUsernameThrottle
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from posts.pagination import KeysetCursorPagination
 
 User = get_user_model()
+
+
+def issue_credentials(user):
+    """Signed access + refresh tokens in JWT mode, otherwise the user's DB token."""
+    if get_auth_mode() == 'jwt':
+        return issue_jwt(user)
+    # Create or get the token for the user
+    token, created = Token.objects.get_or_create(user=user)
+    return {'token': token.key}
+
 # Registration View (using generics.CreateAPIView for simplicity)
 class RegistrationView(generics.CreateAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = UserRegistrationSerializer
     # Allow anyone to access the registration endpoint
     permission_classes = [permissions.AllowAny]
+    # Per-IP limit (see DEFAULT_THROTTLE_RATES); hashing is bounded separately
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'register'
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -26,33 +54,51 @@ class RegistrationView(generics.CreateAPIView):
         
         # Manually get the created user instance
         user = serializer.instance
-        # Create or get the token for the new user
-        token, created = Token.objects.get_or_create(user=user)
 
-        # Return the user data and the token
+        # Return the user data and the credentials
         return Response({
             "user": serializer.data,
-            "token": token.key
+            **issue_credentials(user)
         }, status=status.HTTP_201_CREATED)
 
 # Login View (using APIView for custom login logic)
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
+    # Per-IP and per-username limits backed by the cache
+    throttle_classes = [ScopedRateThrottle, LoginUsernameThrottle]
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         serializer = UserLoginSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
 
-        # Get or create the token
-        token, created = Token.objects.get_or_create(user=user)
-        
         return Response({
-            'token': token.key,
+            **issue_credentials(user),
             'user_id': user.pk,
             'username': user.username
         }, status=status.HTTP_200_OK)
 
+# Logout View: revokes JWTs, or deletes the DB token in token mode
+class LogoutView(APIView):
+    # JWT clients may log out with only their refresh token (access expired)
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        if get_auth_mode() == 'jwt':
+            serializer = LogoutSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            revocation_list.revoke(serializer.validated_data['refresh'])
+            if isinstance(request.auth, AccessToken):
+                revocation_list.revoke(request.auth)
+        elif isinstance(request.auth, Token):
+            # Deleting the token also invalidates the auth cache (accounts/signals.py)
+            Token.objects.filter(key=request.auth.key).delete()
+        else:
+            return Response({"detail": "Authentication credentials were not provided."},
+                            status=status.HTTP_401_UNAUTHORIZED)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 # User Profile View (using generics.RetrieveUpdateAPIView for GET/PUT/PATCH)
 class UserProfileView(generics.RetrieveUpdateAPIView):
     queryset = CustomUser.objects.all()
@@ -62,9 +108,30 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 
     # Override get_object to ensure a user can only view/edit their own profile
     def get_object(self):
-        # Use the currently authenticated user
-        return self.request.user
+        # Use the currently authenticated user, re-read so that stored counters
+        # are current (request.user may come from the authentication cache)
+        return CustomUser.objects.get(pk=self.request.user.pk)
     
+
+# Public profile: read-only, served from the cache with ETag/Last-Modified
+class PublicProfileView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, username, *args, **kwargs):
+        entry = profiles.get_public_profile(username)
+        if entry is None:
+            return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        not_modified = get_conditional_response(
+            request, etag=entry['etag'], last_modified=int(entry['last_modified'].timestamp())
+        )
+        response = not_modified or Response(entry['data'], status=status.HTTP_200_OK)
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'].timestamp())
+        # Shared caches may store it but must revalidate (profiles change on follows)
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
 User = get_user_model()
 
 class FollowToggleView(generics.GenericAPIView): # REQUIRED STRING: generics.GenericAPIView
@@ -87,13 +154,14 @@ class FollowToggleView(generics.GenericAPIView): # REQUIRED STRING: generics.Gen
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        is_following = request.user.following.filter(pk=user_id).exists()
-
-        if is_following:
-            request.user.following.remove(user_to_follow)
+        # Cached adjacency check; the graph falls back to the database if it was stale
+        if not graph.toggle(request.user, user_to_follow):
+            # Drop the unfollowed user's posts from the precomputed feed
+            timeline.purge(request.user, user_to_follow)
             action = "unfollowed"
         else:
-            request.user.following.add(user_to_follow)
+            # Seed the feed with the newly followed user's recent posts
+            timeline.backfill(request.user, user_to_follow)
             action = "followed"
          # NOTIFICATION TRIGGER
             create_notification(
@@ -106,4 +174,90 @@ class FollowToggleView(generics.GenericAPIView): # REQUIRED STRING: generics.Gen
             {"detail": f"Successfully {action} {user_to_follow.username}.", "action": action},
             status=status.HTTP_200_OK
         )
-    
\ No newline at end of file
+    
+
+
+# Bulk follow for onboarding: one request instead of one toggle per account
+class BulkFollowView(APIView):
+    """
+    Follows many users at once: {"user_ids": [...]}. Already-followed and
+    unknown ids are reported but otherwise ignored, so retries are safe.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_ids = serializer.validated_data['user_ids']
+
+        followees = list(
+            User.objects.filter(pk__in=user_ids).exclude(pk=request.user.pk)
+            .only('pk', 'username', 'followers_count')
+        )
+        with transaction.atomic():
+            followed = graph.follow_many(request.user, followees)
+            # Seed the feed with the newly followed users' recent posts
+            timeline.backfill_many(request.user, followed)
+
+        create_notifications(
+            (request.user, followee, "started following you", followee) for followee in followed
+        )
+
+        found = {followee.pk for followee in followees}
+        followed_ids = {followee.pk for followee in followed}
+        return Response({
+            'followed': sorted(followed_ids),
+            'already_following': sorted(found - followed_ids),
+            'not_found': sorted(set(user_ids) - found - {request.user.pk}),
+        }, status=status.HTTP_200_OK)
+
+
+# Followers / following listings: keyset pages over the follow through table
+class FollowListView(generics.ListAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = UserSummarySerializer
+    pagination_class = KeysetCursorPagination
+    # Newest follows first; indexed by accounts_followers/following_list_idx
+    cursor_ordering = ('-id',)
+    # Through-table columns: (the listed user's side, the side that is returned)
+    columns = ('from_customuser', 'to_customuser')
+
+    def get_queryset(self):
+        user = get_object_or_404(User, username=self.kwargs['username'])
+        user_column, listed_column = self.columns
+        return graph.Follow.objects.filter(**{user_column: user}).select_related(listed_column)
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        users = [getattr(edge, self.columns[1]) for edge in page]
+        return self.get_paginated_response(self.get_serializer(users, many=True).data)
+
+
+class RelationshipsView(APIView):
+    """
+    "Do I follow / do they follow me" for many users at once:
+    GET relationships/?ids=1,2,3 answers with a single query.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        serializer = RelationshipsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        me = request.user.pk
+
+        edges = graph.Follow.objects.filter(
+            Q(to_customuser_id=me, from_customuser_id__in=ids)
+            | Q(from_customuser_id=me, to_customuser_id__in=ids)
+        ).values_list('from_customuser_id', 'to_customuser_id')
+        following, followed_by = set(), set()
+        for followed_id, follower_id in edges:
+            if follower_id == me:
+                following.add(followed_id)
+            if followed_id == me:
+                followed_by.add(follower_id)
+
+        return Response({'relationships': [
+            {'id': user_id, 'following': user_id in following, 'followed_by': user_id in followed_by}
+            for user_id in ids
+        ]})
@@ -0,0 +1,181 @@
+# notifications/broker.py
+"""
+Wake-up pub/sub for the notification stream (notifications/stream.py).
+
+Messages carry only recipient ids: "something changed for these users". The
+dispatcher publishes once its rows are committed (write_events) and mark-read
+publishes so other open tabs refresh their badge; every stream connection of
+those users then re-reads what is new. Connections wait on an asyncio.Event,
+so an idle stream costs no thread and no query.
+
+NOTIFICATION_BROKER names the implementation:
+
+* LocalBroker (default): in-process only, enough for a single ASGI worker;
+* RedisBroker: publishes over Redis pub/sub (REDIS_URL) so a notification
+  written by any worker wakes streams held by all of them; each process
+  relays the channel to its local waiters.
+
+Other backends subclass Broker and implement publish(), subscribe() and
+unsubscribe().
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Broker:
+    def publish(self, user_ids):
+        """Wakes every subscription of ``user_ids``; callable from any thread."""
+        raise NotImplementedError
+
+    def subscribe(self, user_id):
+        """A Subscription for ``user_id``; call from the connection's event loop."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class Subscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def notify(self):
+        # Publishers run on other threads (request handlers, the dispatcher)
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass  # The connection's loop has already closed
+
+    async def wait(self, timeout):
+        """True if woken within ``timeout`` seconds. Wake-ups that arrive while
+        the caller is busy are kept and returned by the next wait()."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker(Broker):
+    """Delivers to the subscriptions of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def publish(self, user_ids):
+        self.deliver(user_ids)
+
+    def deliver(self, user_ids):
+        with self._lock:
+            targets = [
+                subscription
+                for user_id in set(user_ids)
+                for subscription in self._subscriptions.get(user_id, ())
+            ]
+        for subscription in targets:
+            subscription.notify()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+class RedisBroker(LocalBroker):
+    """LocalBroker fed by a Redis pub/sub channel shared by every worker."""
+    channel = 'notifications:stream'
+
+    def __init__(self, url=None):
+        super().__init__()
+        self.url = url or settings.REDIS_URL
+        self._client = None
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def _redis(self):
+        import redis
+
+        return redis.Redis.from_url(self.url)
+
+    def publish(self, user_ids):
+        if self._client is None:
+            self._client = self._redis()
+        self._client.publish(self.channel, json.dumps(sorted(set(user_ids))))
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        return super().subscribe(user_id)
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name='notification-broker', daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        # One blocking subscriber per process relays the channel to local waiters
+        while True:
+            try:
+                pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self.deliver(json.loads(message['data']))
+            except Exception:
+                logger.exception('Notification broker connection lost; reconnecting.')
+                time.sleep(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            path = getattr(settings, 'NOTIFICATION_BROKER', 'notifications.broker.LocalBroker')
+            _broker = import_string(path)()
+        return _broker
+
+
+def publish(user_ids):
+    """Wakes the streams of ``user_ids``; never fails the caller."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    try:
+        get_broker().publish(user_ids)
+    except Exception:
+        # The rows are written; streams catch up when they reconnect (Last-Event-ID)
+        logger.exception('Publishing notification wake-ups failed.')
@@ -0,0 +1,252 @@
+# notifications/dispatch.py
+"""
+Notification dispatch pipeline.
+
+Request handlers only enqueue lightweight notification events. In 'async'
+mode an in-process background worker drains the queue and writes events in
+batches, coalescing repeats of the same (recipient, verb, target) into one
+aggregate row (see write_events). Events that cannot be written in time (queue full,
+failed flush, process shutdown) are spilled to the NotificationOutbox table
+and replayed by the worker, so nothing is lost across restarts. In 'sync'
+mode events are written immediately, inside the caller's transaction, which
+is what the tests use.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import broker, unread
+from .models import Notification, NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+EVENT_FIELDS = ('recipient_id', 'actor_id', 'verb', 'content_type_id', 'object_id')
+
+
+def get_mode():
+    return getattr(settings, 'NOTIFICATION_DISPATCH_MODE', 'async')
+
+
+def _coalesce_key(event):
+    return (event['recipient_id'], event['verb'], event['content_type_id'], event['object_id'])
+
+
+def _merge_actors(recent_actors, actor_ids, limit):
+    """
+    Newest-first, de-duplicated actor ids plus how many of them are new.
+    Only the bounded recent_actors are remembered, so an actor who has dropped
+    out of them is counted again: actor_count is an upper bound, exact while
+    an aggregate has at most NOTIFICATION_RECENT_ACTORS distinct actors.
+    """
+    merged = list(recent_actors)
+    added = 0
+    for actor_id in actor_ids:
+        if actor_id in merged:
+            merged.remove(actor_id)
+        else:
+            added += 1
+        merged.insert(0, actor_id)
+    return merged[:limit], added
+
+
+def write_events(events):
+    """
+    Persists a batch of events, coalescing them per (recipient, verb, target):
+    an aggregate row updated within the last NOTIFICATION_COALESCE_WINDOW
+    seconds absorbs the new actors (one UPDATE per key); every other key gets
+    a fresh row, and all of those are inserted with one bulk_create. The batch
+    is written in one transaction.
+    """
+    window = getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 24 * 60 * 60)
+    limit = getattr(settings, 'NOTIFICATION_RECENT_ACTORS', 3)
+    now = timezone.now()
+
+    grouped = {}
+    for event in events:
+        grouped.setdefault(_coalesce_key(event), []).append(event['actor_id'])
+
+    # All or nothing: a failed batch is spilled to the outbox and replayed
+    # whole, so none of its UPDATEs may have landed
+    with transaction.atomic():
+        # One lookup for the open aggregates of every key in the batch
+        open_rows = {}
+        candidates = Notification.objects.filter(
+            recipient_id__in={key[0] for key in grouped},
+            content_type_id__in={key[2] for key in grouped},
+            object_id__in={key[3] for key in grouped},
+            timestamp__gte=now - timedelta(seconds=window),
+        ).order_by('-timestamp').only(
+            'pk', 'recipient', 'verb', 'content_type', 'object_id', 'actor', 'recent_actors', 'is_read'
+        )
+        for row in candidates:
+            open_rows.setdefault((row.recipient_id, row.verb, row.content_type_id, row.object_id), row)
+
+        new_rows = []
+        newly_unread = Counter()
+        for key, actor_ids in grouped.items():
+            row = open_rows.get(key)
+            if row is None:
+                recent, added = _merge_actors([], actor_ids, limit)
+                recipient_id, verb, content_type_id, object_id = key
+                new_rows.append(Notification(
+                    recipient_id=recipient_id, actor_id=recent[0], verb=verb,
+                    content_type_id=content_type_id, object_id=object_id,
+                    actor_count=added, recent_actors=recent,
+                ))
+                newly_unread[recipient_id] += 1
+                continue
+
+            recent, added = _merge_actors(row.recent_actors or [row.actor_id], actor_ids, limit)
+            Notification.objects.filter(pk=row.pk).update(
+                actor_id=recent[0],
+                recent_actors=recent,
+                actor_count=F('actor_count') + added,
+                # New activity resurfaces the aggregate at the top, unread
+                timestamp=now,
+                is_read=False,
+            )
+            if row.is_read:
+                newly_unread[row.recipient_id] += 1
+
+        Notification.objects.bulk_create(new_rows)
+
+    # Only a batch that was written counts towards the unread counters
+    unread.increment(newly_unread)
+    # Wake the recipients' open streams once the rows are visible to them
+    recipient_ids = {key[0] for key in grouped}
+    transaction.on_commit(lambda: broker.publish(recipient_ids))
+
+
+def spill_to_outbox(events):
+    NotificationOutbox.objects.bulk_create([NotificationOutbox(**event) for event in events])
+
+
+def drain_outbox(batch_size=None):
+    """Replays spilled events into Notification rows; returns how many were written."""
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+    written = 0
+    while True:
+        with transaction.atomic():
+            pending = NotificationOutbox.objects.order_by('pk')
+            if connection.features.has_select_for_update_skip_locked:
+                # Let several workers drain the outbox without double delivery
+                pending = pending.select_for_update(skip_locked=True)
+            rows = list(pending.values('pk', *EVENT_FIELDS)[:batch_size])
+            if not rows:
+                return written
+            write_events([{field: row[field] for field in EVENT_FIELDS} for row in rows])
+            NotificationOutbox.objects.filter(pk__in=[row['pk'] for row in rows]).delete()
+        written += len(rows)
+
+
+class NotificationDispatcher:
+    """In-process queue plus a single daemon thread that batch-inserts events."""
+
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def enqueue(self, events):
+        if not events:
+            return
+        if get_mode() == 'sync':
+            write_events(events)
+            return
+        # Only hand events to the worker once the request's transaction commits
+        transaction.on_commit(lambda: self._put(events))
+
+    def _put(self, events):
+        self._ensure_worker()
+        overflow = []
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                overflow.append(event)
+        if overflow:
+            logger.warning('Notification queue full; spilling %d event(s) to the outbox.', len(overflow))
+            spill_to_outbox(overflow)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=getattr(settings, 'NOTIFICATION_QUEUE_SIZE', 10000))
+                atexit.register(self.shutdown)
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='notification-dispatcher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        batch_size = getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+        interval = getattr(settings, 'NOTIFICATION_FLUSH_INTERVAL', 0.5)
+        outbox_interval = getattr(settings, 'NOTIFICATION_OUTBOX_INTERVAL', 30)
+        next_outbox_drain = 0
+
+        while not self._stopping.is_set():
+            if time.monotonic() >= next_outbox_drain:
+                # Replay anything a previous process (or a failed flush) left behind
+                self._safely(drain_outbox)
+                next_outbox_drain = time.monotonic() + outbox_interval
+
+            batch = self._take_batch(batch_size, interval)
+            if batch:
+                self._flush(batch)
+
+    def _take_batch(self, batch_size, timeout):
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        try:
+            write_events(batch)
+        except Exception:
+            logger.exception('Notification flush failed; spilling %d event(s) to the outbox.', len(batch))
+            self._safely(spill_to_outbox, batch)
+        finally:
+            close_old_connections()
+
+    def _safely(self, func, *args):
+        try:
+            return func(*args)
+        except Exception:
+            logger.exception('Notification dispatcher error in %s', func.__name__)
+        finally:
+            close_old_connections()
+
+    def shutdown(self, timeout=5):
+        """Stops the worker and writes (or spills) whatever is still queued."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        remaining = []
+        while self._queue is not None:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if remaining:
+            self._flush(remaining)
+
+
+dispatcher = NotificationDispatcher()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from notifications.dispatch import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Write notifications that were spilled to the outbox table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of outbox rows written per batch')
+
+    def handle(self, *args, **options):
+        written = drain_outbox(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} notification(s) from the outbox.'))
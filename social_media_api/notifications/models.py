@@ -28,8 +28,47 @@ class Notification(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    # Aggregation ("alice and 41 others liked your post"): repeated events for
+    # the same (recipient, verb, target) within NOTIFICATION_COALESCE_WINDOW
+    # update this row instead of inserting new ones. `actor` is the latest actor.
+    # Approximate: an actor repeating after dropping out of recent_actors counts again
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True) # newest first, bounded
+
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # List: WHERE recipient = ? ORDER BY timestamp DESC, id DESC
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='notif_recipient_recent_idx'),
+            # Unread badge and mark-read: only the (small) unread subset is indexed
+            models.Index(
+                fields=['recipient', '-timestamp'], name='notif_recipient_unread_idx',
+                condition=models.Q(is_read=False),
+            ),
+            # Coalescing lookup of open aggregates per (recipient, target)
+            models.Index(
+                fields=['recipient', 'content_type', 'object_id', '-timestamp'],
+                name='notif_coalesce_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.actor.username} {self.verb} {self.target} (to {self.recipient.username})"
+
+class NotificationOutbox(models.Model):
+    """
+    Durable spill-over for queued notifications that have not been written yet
+    (queue full, failed flush or process shutdown); see notifications/dispatch.py.
+    """
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    verb = models.CharField(max_length=255)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
 
     def __str__(self):
-        return f"{self.actor.username} {self.verb} {self.target} (to {self.recipient.username})"
\ No newline at end of file
+        return f"Pending: user {self.actor_id} {self.verb} (to user {self.recipient_id})"
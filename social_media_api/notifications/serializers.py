@@ -1,15 +1,47 @@
 # notifications/serializers.py
 from rest_framework import serializers
+from accounts.expansion import UserExpansionSerializerMixin
 from .models import Notification
 
-class NotificationSerializer(serializers.ModelSerializer):
-    actor_username = serializers.ReadOnlyField(source='actor.username')
+class NotificationSerializer(UserExpansionSerializerMixin, serializers.ModelSerializer):
+    # Usernames come from the request's user expansion (accounts/expansion.py)
+    actor_username = serializers.SerializerMethodField()
     target_type = serializers.ReadOnlyField(source='content_type.model')
+    # e.g. "alice and 41 others liked"
+    summary = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
         fields = (
             'id', 'actor', 'actor_username', 'verb', 'target_type', 'object_id', 
-            'timestamp', 'is_read'
+            'actor_count', 'recent_actors', 'summary', 'timestamp', 'is_read'
         )
-        read_only_fields = fields
\ No newline at end of file
+        read_only_fields = fields
+    expandable_user_fields = ('actor', 'recent_actors')
+
+    def get_actor_username(self, obj):
+        return self.get_user_summary(obj.actor_id)['username']
+
+    def get_summary(self, obj):
+        actor = self.get_actor_username(obj)
+        others = obj.actor_count - 1
+        if others <= 0:
+            return f"{actor} {obj.verb}"
+        noun = "other" if others == 1 else "others"
+        return f"{actor} and {others} {noun} {obj.verb}"
+
+class MarkReadSerializer(serializers.Serializer):
+    """
+    Either an explicit list of ids or a high-water mark in list order: up_to_id
+    (a notification's current position) or up_to (the timestamp of the newest
+    notification the client has shown).
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, max_length=500)
+    up_to_id = serializers.IntegerField(required=False, min_value=1)
+    up_to = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        given = [bool(data.get('ids')), 'up_to_id' in data, 'up_to' in data]
+        if given.count(True) != 1:
+            raise serializers.ValidationError("Provide exactly one of 'ids', 'up_to_id' or 'up_to'.")
+        return data
@@ -0,0 +1,152 @@
+# notifications/stream.py
+"""
+Server-Sent Events stream of new notifications (notifications/stream/).
+
+Replaces polling the list: a client keeps one connection open and receives a
+``notifications`` event with the unread count and every notification that
+is new or updated (coalesced rows move to the top again) since the previous
+event. The view is async, so under an ASGI server (the Procfile runs
+social_media_api.asgi) an open stream is only a parked coroutine waiting on
+the broker (notifications/broker.py); the database is read once when the
+stream opens and once per wake-up, never on a timer.
+
+Each event id is a resume point. EventSource sends it back as Last-Event-ID
+when it reconnects, and the stream picks up from there. Connections are
+closed after NOTIFICATION_STREAM_MAX_AGE seconds (clients reconnect, which
+also re-checks their credentials). Comment heartbeats keep proxies from
+timing out idle streams.
+
+WSGI servers (runserver, a sync gunicorn) buffer a streamed response until
+it ends, so there the view long-polls instead: it answers with a single
+event, as soon as there is news or after NOTIFICATION_STREAM_LONG_POLL
+seconds, and EventSource reconnects with Last-Event-ID to ask for the next.
+"""
+import json
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from accounts.expansion import UserExpander
+
+from . import unread
+from .broker import get_broker
+from .models import Notification
+from .serializers import NotificationSerializer
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _authenticate(request):
+    """The user of the API's own authentication classes (Token / JWT), or None."""
+    drf_request = Request(
+        request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    try:
+        user = drf_request.user
+    except exceptions.APIException:
+        return None
+    return user if user.is_authenticated else None
+
+
+def _parse_event_id(value):
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return moment if timezone.is_aware(moment) else None
+
+
+def snapshot(user, since):
+    """
+    The payload of one event and the resume point after it. Rows stamped
+    within NOTIFICATION_STREAM_OVERLAP seconds before ``since`` are sent
+    again in case they committed late; clients upsert by id.
+    """
+    now = timezone.now()
+    notifications = []
+    if since is not None:
+        overlap = timedelta(seconds=get_setting('NOTIFICATION_STREAM_OVERLAP', 2))
+        rows = list(
+            Notification.objects.filter(recipient=user, timestamp__gt=since - overlap)
+            .select_related('content_type')
+            .order_by('-timestamp', '-id')[:get_setting('NOTIFICATION_STREAM_BATCH', 50)]
+        )
+        expander = UserExpander()
+        expander.load({row.actor_id for row in rows} | {
+            actor_id for row in rows for actor_id in row.recent_actors or ()
+        })
+        notifications = NotificationSerializer(rows, many=True, context={'user_expander': expander}).data
+    payload = {'unread_count': unread.get_unread_count(user.pk), 'notifications': notifications}
+    return payload, now
+
+
+def format_event(payload, event_id):
+    data = json.dumps(payload, cls=JSONEncoder)
+    return f'id: {event_id.isoformat()}\nevent: notifications\ndata: {data}\n\n'
+
+
+def format_retry():
+    return f"retry: {get_setting('NOTIFICATION_STREAM_RETRY_MS', 3000)}\n\n"
+
+
+async def event_stream(user, since):
+    max_age = get_setting('NOTIFICATION_STREAM_MAX_AGE', 300)
+    heartbeat = get_setting('NOTIFICATION_STREAM_HEARTBEAT', 15)
+    # Subscribe before the first read so nothing published in between is lost
+    subscription = get_broker().subscribe(user.pk)
+    try:
+        yield format_retry()
+        deadline = subscription.loop.time() + max_age
+        while True:
+            payload, since = await sync_to_async(snapshot)(user, since)
+            yield format_event(payload, since)
+            while True:
+                remaining = deadline - subscription.loop.time()
+                if remaining <= 0:
+                    return
+                if await subscription.wait(min(heartbeat, remaining)):
+                    break
+                yield ': keepalive\n\n'
+    finally:
+        subscription.close()
+
+
+async def long_poll(user, since):
+    """The single event of a WSGI response; waits for news when resuming."""
+    subscription = get_broker().subscribe(user.pk)
+    try:
+        payload, at = await sync_to_async(snapshot)(user, since)
+        timeout = get_setting('NOTIFICATION_STREAM_LONG_POLL', 25)
+        if since is not None and not payload['notifications'] and await subscription.wait(timeout):
+            payload, at = await sync_to_async(snapshot)(user, since)
+    finally:
+        subscription.close()
+    return format_retry() + format_event(payload, at)
+
+
+@require_GET
+async def notification_stream(request):
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    since = _parse_event_id(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(event_stream(user, since), content_type='text/event-stream')
+    else:
+        response = HttpResponse(await long_poll(user, since), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Ask nginx-style proxies not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,3 +1,248 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from asgiref.sync import sync_to_async
+
+from posts.models import Comment, Post
+from .broker import get_broker
+from .dispatch import dispatcher, drain_outbox, spill_to_outbox, write_events
+from .models import Notification, NotificationOutbox
+from .serializers import NotificationSerializer
+from .utils import build_event, create_notification
+
+User = get_user_model()
+
+
+class DispatchTestMixin:
+    def make_users_and_post(self):
+        self.author = User.objects.create_user(username='author')
+        self.fan = User.objects.create_user(username='fan')
+        self.post = Post.objects.create(author=self.author, title='Post', content='Body')
+
+
+@override_settings(NOTIFICATION_DISPATCH_MODE='sync')
+class SyncDispatchTests(DispatchTestMixin, TestCase):
+    def setUp(self):
+        self.make_users_and_post()
+
+    def test_sync_mode_writes_immediately(self):
+        create_notification(self.fan, self.author, 'liked', self.post)
+        self.assertEqual(Notification.objects.get().target, self.post)
+
+    def test_outbox_is_replayed(self):
+        spill_to_outbox([build_event(self.fan, self.author, 'liked', self.post)])
+
+        self.assertEqual(drain_outbox(), 1)
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(Notification.objects.get().actor, self.fan)
+
+
+@override_settings(NOTIFICATION_DISPATCH_MODE='sync')
+class CoalescingTests(DispatchTestMixin, TestCase):
+    def setUp(self):
+        self.make_users_and_post()
+        self.others = [User.objects.create_user(username=f'other{i}') for i in range(3)]
+
+    def test_repeated_events_update_one_aggregate_row(self):
+        # The repeated like from `fan` (e.g. unlike + like) is not counted twice
+        for actor in [self.fan, self.others[0], self.fan, self.others[1], self.others[2]]:
+            create_notification(actor, self.author, 'liked', self.post)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 4)
+        self.assertEqual(notification.actor, self.others[2])
+        self.assertEqual(notification.recent_actors, [self.others[2].pk, self.others[1].pk, self.fan.pk])
+        self.assertEqual(NotificationSerializer(notification).data['summary'], 'other2 and 3 others liked')
+
+    @override_settings(NOTIFICATION_RECENT_ACTORS=2)
+    def test_actor_count_is_an_upper_bound_beyond_recent_actors(self):
+        # `fan` has dropped out of the two remembered actors when liking again
+        for actor in [self.fan, self.others[0], self.others[1], self.fan]:
+            create_notification(actor, self.author, 'liked', self.post)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recent_actors, [self.fan.pk, self.others[1].pk])
+        self.assertEqual(notification.actor_count, 4)
+
+    def test_events_outside_the_window_start_a_new_row(self):
+        create_notification(self.fan, self.author, 'liked', self.post)
+        Notification.objects.update(timestamp=timezone.now() - timedelta(days=2))
+        create_notification(self.others[0], self.author, 'liked', self.post)
+
+        self.assertEqual(Notification.objects.count(), 2)
+
+
+    def test_failed_batch_leaves_no_partial_writes(self):
+        create_notification(self.fan, self.author, 'liked', self.post)
+        batch = [
+            build_event(self.others[0], self.author, 'liked', self.post),
+            build_event(self.fan, self.others[1], 'started following you', self.others[1]),
+        ]
+        with mock.patch.object(Notification.objects, 'bulk_create', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            write_events(batch)
+        self.assertEqual(Notification.objects.get().actor_count, 1)
+
+        # Replaying the spilled batch counts every actor once
+        spill_to_outbox(batch)
+        drain_outbox()
+        self.assertEqual(Notification.objects.get(recipient=self.author).actor_count, 2)
+
+@override_settings(NOTIFICATION_DISPATCH_MODE='async', NOTIFICATION_FLUSH_INTERVAL=0.05)
+class AsyncDispatchTests(DispatchTestMixin, TransactionTestCase):
+    def setUp(self):
+        self.make_users_and_post()
+
+    def test_worker_batch_inserts_queued_events(self):
+        for verb in ('liked', 'commented on your post'):
+            create_notification(self.fan, self.author, verb, self.post)
+
+        dispatcher.shutdown()
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATION_DISPATCH_MODE='sync')
+class UnreadCountTests(DispatchTestMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.make_users_and_post()
+        self.comments = [
+            Comment.objects.create(post=self.post, author=self.fan, content=f'Comment {i}')
+            for i in range(3)
+        ]
+        self.client.force_authenticate(self.author)
+
+    def unread_count(self):
+        return self.client.get(reverse('notification-unread-count')).data['unread_count']
+
+    def test_counter_tracks_new_notifications_and_mark_read(self):
+        create_notification(self.fan, self.author, 'commented on your post', self.comments[0])
+        self.assertEqual(self.unread_count(), 1)
+
+        # Served from the cache, incremented by the dispatcher
+        for comment in self.comments[1:]:
+            create_notification(self.fan, self.author, 'commented on your post', comment)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 3)
+
+        ids = list(Notification.objects.order_by('pk').values_list('pk', flat=True))
+        response = self.client.post(reverse('notification-mark-read'), {'ids': ids[:1]}, format='json')
+        self.assertEqual(response.data, {'marked': 1, 'unread_count': 2})
+
+        response = self.client.post(reverse('notification-mark-read'), {'up_to_id': ids[-1]}, format='json')
+        self.assertEqual(response.data, {'marked': 2, 'unread_count': 0})
+
+    def test_up_to_follows_list_order_for_resurfaced_aggregates(self):
+        liker = User.objects.create_user(username='liker')
+        create_notification(self.fan, self.author, 'liked', self.post)
+        create_notification(self.fan, self.author, 'commented on your post', self.comments[0])
+        # A new like resurfaces the older aggregate above the newer-pk row
+        create_notification(liker, self.author, 'liked', self.post)
+        listed = [item['id'] for item in self.client.get(reverse('notification-list')).data['results']]
+        self.assertGreater(listed[1], listed[0])
+
+        response = self.client.post(reverse('notification-mark-read'), {'up_to_id': listed[0]}, format='json')
+        self.assertEqual(response.data, {'marked': 2, 'unread_count': 0})
+
+    def test_up_to_timestamp_marks_what_was_shown(self):
+        create_notification(self.fan, self.author, 'liked', self.post)
+        shown = self.client.get(reverse('notification-list')).data['results'][0]['timestamp']
+        create_notification(self.fan, self.author, 'commented on your post', self.comments[0])
+
+        response = self.client.post(reverse('notification-mark-read'), {'up_to': shown}, format='json')
+        self.assertEqual(response.data, {'marked': 1, 'unread_count': 1})
+
+    def test_listing_does_not_mark_read(self):
+        create_notification(self.fan, self.author, 'liked', self.post)
+        self.client.get(reverse('notification-list'))
+        self.assertEqual(self.unread_count(), 1)
+
+
+def parse_event(chunk):
+    fields = dict(line.split(': ', 1) for line in chunk.decode().strip().splitlines())
+    return fields['id'], json.loads(fields['data'])
+
+
+@override_settings(
+    NOTIFICATION_DISPATCH_MODE='sync', SECURE_SSL_REDIRECT=False,
+    NOTIFICATION_BROKER='notifications.broker.LocalBroker',
+)
+class NotificationStreamTests(DispatchTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.make_users_and_post()
+        self.token = Token.objects.create(user=self.author)
+
+    def test_stream_requires_authentication(self):
+        response = self.client.get(reverse('notification-stream'))
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(NOTIFICATION_STREAM_LONG_POLL=0.01)
+    def test_wsgi_requests_long_poll_one_event(self):
+        headers = {'authorization': f'Token {self.token.key}'}
+        response = self.client.get(reverse('notification-stream'), headers=headers)
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+        event_id, initial = parse_event(response.content.split(b'\n\n', 1)[1])
+        self.assertEqual(initial, {'unread_count': 0, 'notifications': []})
+
+        # Nothing new: answered empty once the long poll times out
+        response = self.client.get(reverse('notification-stream'), headers={**headers, 'last-event-id': event_id})
+        self.assertEqual(parse_event(response.content.split(b'\n\n', 1)[1])[1]['notifications'], [])
+
+        create_notification(self.fan, self.author, 'liked', self.post)
+        response = self.client.get(reverse('notification-stream'), headers={**headers, 'last-event-id': event_id})
+        _, update = parse_event(response.content.split(b'\n\n', 1)[1])
+        self.assertEqual(update['unread_count'], 1)
+        self.assertEqual([n['verb'] for n in update['notifications']], ['liked'])
+
+    def test_dispatcher_publishes_recipients_after_commit(self):
+        with mock.patch('notifications.broker.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                create_notification(self.fan, self.author, 'liked', self.post)
+                publish.assert_not_called()
+        publish.assert_called_once_with({self.author.pk})
+
+    @override_settings(NOTIFICATION_STREAM_HEARTBEAT=0.01, NOTIFICATION_STREAM_MAX_AGE=0.5)
+    async def test_stream_sends_new_notifications_when_woken(self):
+        response = await self.async_client.get(
+            reverse('notification-stream'), headers={'authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry: '))
+        _, initial = parse_event(await anext(stream))
+        self.assertEqual(initial, {'unread_count': 0, 'notifications': []})
+        # Idle streams only send keep-alive comments
+        self.assertEqual(await anext(stream), b': keepalive\n\n')
+
+        await sync_to_async(create_notification)(self.fan, self.author, 'liked', self.post)
+        get_broker().publish([self.author.pk])
+        events = [parse_event(chunk) async for chunk in stream if not chunk.startswith(b':')]
+        # One event for the wake-up, then the stream ends at its max age
+        self.assertEqual(len(events), 1)
+        _, update = events[0]
+        self.assertEqual(update['unread_count'], 1)
+        self.assertEqual([n['verb'] for n in update['notifications']], ['liked'])
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    @override_settings(NOTIFICATION_STREAM_MAX_AGE=0)
+    async def test_last_event_id_resumes_the_stream(self):
+        await sync_to_async(create_notification)(self.fan, self.author, 'liked', self.post)
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+        response = await self.async_client.get(
+            reverse('notification-stream'),
+            headers={'authorization': f'Token {self.token.key}', 'last-event-id': since},
+        )
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+        _, initial = parse_event(await anext(stream))
+        self.assertEqual(len(initial['notifications']), 1)
@@ -0,0 +1,49 @@
+# notifications/unread.py
+"""
+Per-user unread-notification counters kept in the cache.
+
+The dispatcher increments the counter when it writes a new unread row (or
+re-opens a read aggregate) and mark-read resets it. A missing key is simply
+recomputed from the partial unread index, and the TTL bounds any drift.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Notification
+
+
+def _key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'NOTIFICATION_UNREAD_COUNT_TTL', 10 * 60)
+
+
+def count_unread(user_id):
+    return Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+
+
+def get_unread_count(user_id):
+    count = cache.get(_key(user_id))
+    if count is None:
+        count = count_unread(user_id)
+        # add() rather than set() so a concurrent increment is not overwritten
+        cache.add(_key(user_id), count, _timeout())
+    return count
+
+
+def increment(counts):
+    """Adds ``{user_id: n}`` to cached counters; absent keys are left to recompute."""
+    for user_id, amount in counts.items():
+        try:
+            cache.incr(_key(user_id), amount)
+        except ValueError:
+            pass
+
+
+def reset(user_id):
+    """Re-reads the counter after notifications were marked read."""
+    count = count_unread(user_id)
+    cache.set(_key(user_id), count, _timeout())
+    return count
@@ -1,7 +1,11 @@
 # notifications/urls.py
 from django.urls import path
-from .views import NotificationListView
+from .views import NotificationListView, UnreadCountView, MarkReadView
+from .stream import notification_stream
 
 urlpatterns = [
     path('', NotificationListView.as_view(), name='notification-list'),
-]
\ No newline at end of file
+    path('unread-count/', UnreadCountView.as_view(), name='notification-unread-count'),
+    path('stream/', notification_stream, name='notification-stream'),
+    path('mark-read/', MarkReadView.as_view(), name='notification-mark-read'),
+]
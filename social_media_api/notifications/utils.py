@@ -1,15 +1,32 @@
 # notifications/utils.py
-from .models import Notification
 from django.contrib.contenttypes.models import ContentType
 
+from .dispatch import dispatcher
+
+
+def build_event(actor, recipient, verb, target):
+    """Describes a notification as plain ids; ContentType lookups are cached."""
+    return {
+        'recipient_id': recipient.pk,
+        'actor_id': actor.pk,
+        'verb': verb,
+        'content_type_id': ContentType.objects.get_for_model(target).pk,
+        'object_id': target.pk,
+    }
+
+
 def create_notification(actor, recipient, verb, target):
-    """Creates a notification instance."""
+    """Enqueues a notification; it is written by the dispatcher (see dispatch.py)."""
     if actor == recipient:
         return # Do not notify user for their own actions
-        
-    Notification.objects.create(
-        recipient=recipient,
-        actor=actor,
-        verb=verb,
-        target=target
-    )
\ No newline at end of file
+
+    dispatcher.enqueue([build_event(actor, recipient, verb, target)])
+
+
+def create_notifications(items):
+    """Enqueues many (actor, recipient, verb, target) notifications as one batch."""
+    dispatcher.enqueue([
+        build_event(actor, recipient, verb, target)
+        for actor, recipient, verb, target in items
+        if actor != recipient
+    ])
@@ -1,22 +1,79 @@
 # notifications/views.py
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.db import transaction
+from django.db.models import Q
 from .models import Notification
-from .serializers import NotificationSerializer
-# Assuming CustomPageNumberPagination is available in posts app
-from posts.pagination import CustomPageNumberPagination 
+from .serializers import NotificationSerializer, MarkReadSerializer
+from . import broker, unread
+# Shared keyset pagination from the posts app
+from posts.pagination import CursorOrPageNumberPagination
+from accounts.expansion import UserExpansionMixin
 
-class NotificationListView(generics.ListAPIView):
+# Rows updated per statement when marking notifications read
+MARK_READ_BATCH_SIZE = 1000
+
+class NotificationListView(UserExpansionMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = NotificationSerializer
-    pagination_class = CustomPageNumberPagination 
+    pagination_class = CursorOrPageNumberPagination
+    cursor_ordering = ('-timestamp', '-id')
+    # Actors are expanded per page (see accounts/expansion.py)
+    expansion_user_attrs = ('actor_id', 'recent_actors')
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
-
-    def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs)
-        
-        # Mark all retrieved notifications as read after they are listed
-        self.get_queryset().filter(is_read=False).update(is_read=True)
-        
-        return response
\ No newline at end of file
+        # Listing is read-only; clients mark notifications read explicitly (mark-read/)
+        return Notification.objects.filter(recipient=self.request.user).select_related('content_type')
+
+
+class UnreadCountView(APIView):
+    """Cheap badge endpoint: reads a cached per-user counter."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response({'unread_count': unread.get_unread_count(request.user.pk)})
+
+
+class MarkReadView(APIView):
+    """
+    Marks the given ids, or everything listed at or below a high-water mark
+    (up_to_id / up_to), as read.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        pending = Notification.objects.filter(recipient=request.user, is_read=False)
+        if data.get('ids'):
+            pending = pending.filter(pk__in=data['ids'])
+        elif 'up_to' in data:
+            pending = pending.filter(timestamp__lte=data['up_to'])
+        else:
+            # The list is ordered by (timestamp, id), not by id: a coalesced
+            # aggregate keeps its pk but moves to the top when it resurfaces
+            mark = Notification.objects.filter(
+                recipient=request.user, pk=data['up_to_id']
+            ).values_list('timestamp', flat=True).first()
+            if mark is None:
+                raise ValidationError({'up_to_id': ['Unknown notification.']})
+            pending = pending.filter(Q(timestamp__lt=mark) | Q(timestamp=mark, pk__lte=data['up_to_id']))
+
+        marked = 0
+        while True:
+            batch = list(pending.order_by('pk').values_list('pk', flat=True)[:MARK_READ_BATCH_SIZE])
+            if not batch:
+                break
+            marked += Notification.objects.filter(pk__in=batch).update(is_read=True)
+
+        unread_count = unread.reset(request.user.pk)
+        # Let the user's other open streams refresh their badge
+        transaction.on_commit(lambda: broker.publish([request.user.pk]))
+        return Response(
+            {'marked': marked, 'unread_count': unread_count},
+            status=status.HTTP_200_OK
+        )
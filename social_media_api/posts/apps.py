@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import search, signals  # noqa: F401 (keeps the search index current)
+
+        # Migrations may have created (or dropped) the FTS5 table
+        post_migrate.connect(search.reset_backend, sender=self)
@@ -0,0 +1,86 @@
+# posts/conditional.py
+"""
+Conditional GET for posts, comments and the feed.
+
+The validators of a response are computed with one aggregate query over
+exactly the rows it would contain (for a keyset page, the page_size + 1 rows
+of the paginator's window): how many there are, the sum of their ids and the
+newest ``conditional_modified_field``. Any edit, counter change, insertion or
+removal in the window changes that triple, so a matching If-None-Match is
+answered with 304 before the page is loaded or serialized.
+
+The ETag also covers the request's path and query string and the user, and
+it is weak: embedded user summaries (username, avatar) are not part of it.
+Lists honour If-None-Match only, because a post leaving the page does not
+move the newest timestamp forward; single objects honour If-Modified-Since
+as well. Numbered pages (?page=) carry a total count and are not validated.
+"""
+import hashlib
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def fingerprint(queryset, modified_field):
+    """{'count', 'ids', 'modified'} of the rows in ``queryset``, in one query."""
+    return queryset.aggregate(count=Count('pk'), ids=Sum('pk'), modified=Max(modified_field))
+
+
+class ConditionalGetMixin:
+    """
+    For list/retrieve views: adds ETag and Last-Modified to GET responses and
+    answers 304 Not Modified from the aggregate alone.
+    """
+    conditional_modified_field = 'updated_at'
+
+    def get_validators(self, request, queryset):
+        state = fingerprint(queryset, self.conditional_modified_field)
+        if not state['count']:
+            # Let the view produce its empty page or 404 as usual
+            return None
+        user_id = request.user.pk if request.user.is_authenticated else ''
+        key = f"{request.get_full_path()}|{user_id}|{state['count']}|{state['ids']}|{state['modified'].isoformat()}"
+        return {
+            'etag': 'W/"%s"' % hashlib.md5(key.encode(), usedforsecurity=False).hexdigest(),
+            'last_modified': int(state['modified'].timestamp()),
+        }
+
+    def conditional_response(self, request, queryset, respond, use_last_modified):
+        validators = self.get_validators(request, queryset) if queryset is not None else None
+        if validators is None:
+            return respond()
+
+        response = get_conditional_response(
+            request,
+            etag=validators['etag'],
+            last_modified=validators['last_modified'] if use_last_modified else None,
+        )
+        if response is None:
+            response = respond()
+        if response.status_code in (200, 304):
+            response['ETag'] = validators['etag']
+            response['Last-Modified'] = http_date(validators['last_modified'])
+            # Always revalidate; responses differ per user and per credentials
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        get_window = getattr(self.paginator, 'get_window', None)
+        window = get_window(queryset, request, self) if get_window else None
+        return self.conditional_response(
+            request, window, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+            use_last_modified=False,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        return self.conditional_response(
+            request, queryset, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+            use_last_modified=True,
+        )
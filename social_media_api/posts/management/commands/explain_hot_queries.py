@@ -0,0 +1,103 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts import graph
+from accounts.graph import Follow
+from notifications.models import Notification
+from posts import timeline
+from posts.models import Comment, Post, Suggestion
+
+# Plan lines that mean "read the whole table": PostgreSQL and SQLite wording
+SEQ_SCAN_PATTERNS = [
+    re.compile(r'Seq Scan on (\w+)'),
+    re.compile(r'\bSCAN (\w+)(?!.*\bUSING\b)'),
+]
+# Plan lines that mean "sort the matching rows" instead of reading an index in order
+SORT_PATTERNS = [
+    re.compile(r'\bSort\s+\('),
+    re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY'),
+]
+# Hot queries allowed to sort: the fan-out-on-read feed merges every followed
+# author's posts and only runs with TIMELINE_ENABLED off
+SORTING_ALLOWED = {'feed (fan-out-on-read)'}
+
+
+def hot_querysets(user, post_id):
+    """The read paths behind the busiest endpoints, in the shape the views run them."""
+    return {
+        'post list': Post.objects.order_by('-created_at', '-id')[:10],
+        'feed (timeline)': timeline.timeline_keys(user)[:11],
+        'feed (timeline, next page)': timeline.timeline_keys(user, position=(timezone.now(), post_id))[:11],
+        'feed (high-fanout author)': timeline.author_keys(user.pk, position=(timezone.now(), post_id))[:11],
+        'feed (high-fanout authors)': timeline.high_fanout_authors(user).values('pk'),
+        'feed (page posts)': Post.objects.filter(pk__in=[post_id]).order_by(),
+        'feed (fan-out-on-read)': Post.objects.filter(
+            author__in=list(graph.following_ids(user.pk))
+        ).order_by('-created_at', '-id')[:10],
+        'comment list': Comment.objects.filter(post_id=post_id).order_by('created_at', 'id')[:10],
+        'notification list': Notification.objects.filter(
+            recipient=user
+        ).order_by('-timestamp', '-id')[:10],
+        'unread notifications': Notification.objects.filter(
+            recipient=user, is_read=False
+        ).order_by('-timestamp')[:10],
+        'followers list': Follow.objects.filter(from_customuser=user).order_by('-id')[:10],
+        'following list': Follow.objects.filter(to_customuser=user).order_by('-id')[:10],
+        'suggestions': Suggestion.objects.filter(
+            prefix='ab', kind=Suggestion.KIND_POST
+        ).order_by('-weight', '-object_id').values('object_id', 'label')[:8],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the hot querysets and report any sequential scans or sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to build the per-user queries for')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan')
+        parser.add_argument('--fail', action='store_true',
+                            help='Exit with an error if any sequential scan or sort is found')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.order_by('pk')
+        user = users.filter(username=options['user']).first() if options['user'] else users.first()
+        if user is None:
+            raise CommandError('No user found to build the per-user queries for.')
+        post_id = Post.objects.values_list('pk', flat=True).first() or 0
+
+        offenders = []
+        for name, queryset in hot_querysets(user, post_id).items():
+            plan = self.explain(queryset)
+            scans = sorted({
+                match.group(1)
+                for pattern in SEQ_SCAN_PATTERNS
+                for match in pattern.finditer(plan)
+            } - {'CONSTANT'})
+            sorts = name not in SORTING_ALLOWED and any(pattern.search(plan) for pattern in SORT_PATTERNS)
+            if scans:
+                offenders.append(name)
+                self.stdout.write(self.style.ERROR(f'✗ {name}: sequential scan of {", ".join(scans)}'))
+            elif sorts:
+                offenders.append(name)
+                self.stdout.write(self.style.ERROR(f'✗ {name}: sorts instead of reading an index in order'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✓ {name}'))
+            if scans or sorts or options['verbose_plans']:
+                self.stdout.write(f'  {plan}'.replace('\n', '\n  '))
+
+        if offenders and options['fail']:
+            raise CommandError(f'Sequential scans or sorts in: {", ".join(offenders)}')
+
+    def explain(self, queryset):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small tables make seq scans the cheapest plan; disabling them
+                # shows whether a usable index exists at all.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search-as-you-type suggestion index and refresh its weights'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of posts or users indexed per batch')
+
+    def handle(self, *args, **options):
+        written = suggestions.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{count} {kind} suggestion row(s)' for kind, count in written.items()) + ' written.'
+        ))
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized feed timelines from the current follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the timeline of this username')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of users loaded per batch')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        rebuilt = entries = 0
+        for user in users.iterator(chunk_size=options['batch_size']):
+            entries += timeline.rebuild(user)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rebuilt} timeline(s) with {entries} entries.'
+        ))
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+
+from posts import response_cache, suggestions
+from posts.models import Comment, Post
+
+
+def count_of(model, column):
+    """Correlated COUNT(*) of ``model`` rows whose ``column`` points at the outer row."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{column: OuterRef('pk')})
+        .order_by().values(column)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Repair drift in the denormalized like, comment and follower counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows checked per batch')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted rows without fixing them')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        Follow = User.followers.through
+
+        counters = [
+            (Post, {
+                'likes_count': count_of(Post.likes.through, 'post'),
+                'comments_count': count_of(Comment, 'post'),
+            }),
+            (User, {
+                # CustomUser.followers rows point from the followed user to the follower
+                'followers_count': count_of(Follow, 'from_customuser'),
+                'following_count': count_of(Follow, 'to_customuser'),
+            }),
+        ]
+        for model, expressions in counters:
+            drifted = self.repair(model, expressions, options['batch_size'], options['dry_run'])
+            verb = 'Found' if options['dry_run'] else 'Repaired'
+            self.stdout.write(self.style.SUCCESS(
+                f'{verb} {drifted} {model._meta.verbose_name_plural} with drifted counters.'
+            ))
+
+    def repair(self, model, expressions, batch_size, dry_run):
+        fields = list(expressions)
+        actual = {f'actual_{field}': expression for field, expression in expressions.items()}
+        drifted_total, last_pk = 0, 0
+
+        while True:
+            batch = list(
+                model.objects.filter(pk__gt=last_pk).order_by('pk')
+                .annotate(**actual).values('pk', *fields, *actual)[:batch_size]
+            )
+            if not batch:
+                return drifted_total
+            last_pk = batch[-1]['pk']
+
+            drifted = [
+                row['pk'] for row in batch
+                if any(row[field] != row[f'actual_{field}'] for field in fields)
+            ]
+            if drifted and not dry_run:
+                # Recompute inside the UPDATE so concurrent increments are not lost
+                updates = dict(expressions)
+                if model is Post:
+                    # Counters are covered by the posts' HTTP validators and cached responses
+                    updates['activity_at'] = Now()
+                    response_cache.invalidate(*response_cache.post_namespaces(drifted))
+                model.objects.filter(pk__in=drifted).update(**updates)
+                if model is Post:
+                    suggestions.refresh_post_weights(drifted)
+            drifted_total += len(drifted)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search documents of every post'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of posts reindexed per batch')
+
+    def handle(self, *args, **options):
+        if search.backend() is None:
+            self.stdout.write(self.style.WARNING(
+                'No full-text index on this database; search uses icontains filtering.'
+            ))
+            return
+
+        # Walk the primary key so every batch is one short, indexed range read
+        indexed = last_id = 0
+        while True:
+            ids = list(Post.objects.filter(pk__gt=last_id).order_by('pk')
+                       .values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            search.index_posts(ids)
+            indexed += len(ids)
+            last_id = ids[-1]
+        removed = search.remove_orphans()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reindexed {indexed} post(s); removed {removed} stale document(s).'
+        ))
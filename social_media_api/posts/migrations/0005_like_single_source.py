@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def copy_m2m_likes_to_like(apps, schema_editor):
+    """Reconciles the old auto-created Post.likes rows into the Like table."""
+    Post = apps.get_model('posts', 'Post')
+    Like = apps.get_model('posts', 'Like')
+    PostLike = Post._meta.get_field('likes').remote_field.through
+
+    rows = PostLike.objects.order_by('pk').values_list('post_id', 'customuser_id')
+    batch = []
+    for post_id, user_id in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(Like(post_id=post_id, user_id=user_id))
+        if len(batch) >= BATCH_SIZE:
+            Like.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Like.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def recount_likes(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Like = apps.get_model('posts', 'Like')
+    Post.objects.update(likes_count=Coalesce(Subquery(
+        Like.objects.filter(post=OuterRef('pk'))
+        .order_by().values('post')
+        .annotate(total=Count('pk')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_comments_count_post_likes_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_m2m_likes_to_like, migrations.RunPython.noop),
+        # Django cannot add `through` to an existing M2M, so drop the
+        # auto-created table and re-add the field on top of Like.
+        migrations.RemoveField(
+            model_name='post',
+            name='likes',
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes',
+            field=models.ManyToManyField(blank=True, related_name='liked_posts', through='posts.Like', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(recount_likes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:05
+
+from django.db import migrations
+
+
+# The search document lives outside the ORM (see posts/search.py), in the form
+# the database supports: an FTS5 virtual table on SQLite, a tsvector table with
+# a GIN index on PostgreSQL. Other databases get nothing and search falls back
+# to icontains filtering.
+FTS_TABLE = 'posts_post_fts'
+SEARCH_TABLE = 'posts_post_search'
+SEARCH_CONFIG = 'english'
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"title, content, tokenize='porter unicode61', prefix='2 3')"
+            )
+        except Exception:
+            # SQLite built without FTS5
+            return
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, content) SELECT id, title, content FROM posts_post'
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE {SEARCH_TABLE} ('
+            f'post_id bigint PRIMARY KEY REFERENCES posts_post (id) ON DELETE CASCADE '
+            f'DEFERRABLE INITIALLY DEFERRED, '
+            f'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING GIN (document)'
+        )
+        schema_editor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (post_id, document) "
+            f"SELECT id, setweight(to_tsvector(%s::regconfig, coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector(%s::regconfig, coalesce(content, '')), 'B') FROM posts_post",
+            [SEARCH_CONFIG, SEARCH_CONFIG],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
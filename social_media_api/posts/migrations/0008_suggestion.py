@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=20)),
+                ('kind', models.CharField(choices=[('post', 'Post'), ('user', 'User')], max_length=4)),
+                ('object_id', models.BigIntegerField()),
+                ('label', models.CharField(max_length=255)),
+                ('weight', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['prefix', 'kind', '-weight', '-object_id'], name='posts_suggestion_lookup_idx'), models.Index(fields=['kind', 'object_id'], name='posts_suggestion_object_idx')],
+                'constraints': [models.UniqueConstraint(fields=('prefix', 'kind', 'object_id'), name='posts_suggestion_unique')],
+            },
+        ),
+    ]
@@ -1,6 +1,53 @@
 # posts/models.py
 from django.db import models
 from django.conf import settings # Use this to reference the CustomUser model
+from django.db.models.functions import Now, RowNumber
+
+
+class PostQuerySet(models.QuerySet):
+    def with_list_data(self, comment_preview=3):
+        """
+        Loads everything PostSerializer reads in a fixed number of queries:
+        unless comment_preview is 0, the latest ``comment_preview`` comments of
+        every post via one windowed prefetch. Counts come from the stored
+        counter columns; authors are expanded per page (accounts/expansion.py).
+        """
+        queryset = self
+        if comment_preview:
+            queryset = queryset.prefetch_related(models.Prefetch(
+                'comments',
+                queryset=Comment.objects.latest_per_post(comment_preview),
+                to_attr='comment_preview',
+            ))
+        return queryset
+
+    def adjust_counter(self, field, delta):
+        """Atomic ``field = field + delta`` on every post in the queryset."""
+        queryset = self
+        if delta < 0:
+            # Never let a counter that has drifted go negative
+            queryset = queryset.filter(**{f'{field}__gte': -delta})
+        return queryset.update(**{field: models.F(field) + delta}, activity_at=Now())
+
+    def touch(self):
+        """Marks the posts as changed without editing them (see Post.activity_at)."""
+        return self.update(activity_at=Now())
+
+
+class CommentQuerySet(models.QuerySet):
+    def latest_per_post(self, limit):
+        """
+        The newest ``limit`` comments of each post in a single query, using
+        ROW_NUMBER() partitioned by post; returned oldest first per post.
+        """
+        return self.annotate(
+            preview_rank=models.Window(
+                RowNumber(),
+                partition_by=models.F('post_id'),
+                order_by=[models.F('created_at').desc(), models.F('id').desc()],
+            )
+        ).filter(preview_rank__lte=limit).order_by('created_at', 'id')
+
 
 class Post(models.Model):
     author = models.ForeignKey(
@@ -12,10 +59,15 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Last change to anything rendered with the post: the post itself, its
+    # counters or its comments. Drives the list/detail validators (posts/conditional.py).
+    activity_at = models.DateTimeField(auto_now=True)
 
     # NEW: ManyToMany field for tracking users who liked the post
+    # Backed by the Like model, which is the single source of truth for likes
     likes = models.ManyToManyField(
         settings.AUTH_USER_MODEL,
+        through='Like',
         related_name='liked_posts',
         blank=True
     )
@@ -27,14 +79,27 @@ class Post(models.Model):
         blank=True
     )
 
+    # Denormalized counters, kept in step with atomic F() updates
+    # (see toggle_like and CommentViewSet); `manage.py recount` repairs drift.
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Post list: ORDER BY created_at DESC, id DESC (keyset pagination)
+            models.Index(fields=['-created_at', '-id'], name='posts_post_recent_idx'),
+            # Feed fan-out-on-read, timeline backfill: WHERE author = ? ORDER BY created_at DESC
+            models.Index(fields=['author', '-created_at', '-id'], name='posts_post_author_recent_idx'),
+        ]
 
     def __str__(self):
         return self.title
         
     def total_likes(self):
-        return self.likes.count() # Helper method
+        return self.likes_count # Helper method (stored counter)
     
 
 class Comment(models.Model):
@@ -52,14 +117,20 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Comment lists and previews: WHERE post = ? ORDER BY created_at, id
+            models.Index(fields=['post', 'created_at', 'id'], name='posts_comment_post_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username} on Post {self.post.id}"
     
 class Like(models.Model): # REQUIRED STRING: "Like"
-    """Model to track likes explicitly, as requested by the checker."""
+    """Model to track likes explicitly; also the through table behind Post.likes."""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -69,4 +140,69 @@ class Like(models.Model): # REQUIRED STRING: "Like"
         unique_together = ('user', 'post')
         
     def __str__(self):
-        return f'{self.user.username} likes {self.post.title[:20]}'
\ No newline at end of file
+        return f'{self.user.username} likes {self.post.title[:20]}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Materialized feed row: one per (follower, post), written when the post is
+    created (fan-out-on-write) so FeedView can read an already-ordered list of
+    post ids instead of joining and sorting every followed author's posts.
+    """
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # Copied from the post so the timeline can be ordered without a join
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        ordering = ['-created_at', '-post']
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='posts_timeline_owner_idx'),
+        ]
+
+    def __str__(self):
+        return f'Post {self.post_id} in timeline of user {self.owner_id}'
+
+
+class Suggestion(models.Model):
+    """
+    Edge n-gram row of the search-as-you-type index: one per (prefix, object)
+    for every leading substring of every word of a post title or username,
+    so a suggestion lookup is an equality match on ``prefix`` that reads the
+    best rows straight off the index. Maintained by posts/suggestions.py.
+    """
+    KIND_POST = 'post'
+    KIND_USER = 'user'
+    KIND_CHOICES = [(KIND_POST, 'Post'), (KIND_USER, 'User')]
+
+    prefix = models.CharField(max_length=20)
+    kind = models.CharField(max_length=4, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # Copied from the source row so suggestions are served without a join
+    label = models.CharField(max_length=255)
+    # Popularity (likes or followers); orders suggestions. Post weights are
+    # kept in step with likes_count (suggestions.refresh_post_weights)
+    weight = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['prefix', 'kind', 'object_id'], name='posts_suggestion_unique'),
+        ]
+        indexes = [
+            # WHERE prefix = ? AND kind = ? ORDER BY weight DESC, object_id DESC LIMIT n
+            models.Index(fields=['prefix', 'kind', '-weight', '-object_id'], name='posts_suggestion_lookup_idx'),
+            # Reindexing and removal of one object's rows
+            models.Index(fields=['kind', 'object_id'], name='posts_suggestion_object_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.prefix!r} -> {self.kind} {self.object_id}'
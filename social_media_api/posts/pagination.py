@@ -1,5 +1,11 @@
 # posts/pagination.py
-from rest_framework.pagination import PageNumberPagination
+from operator import attrgetter
+
+from django.core import signing
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 class CustomPageNumberPagination(PageNumberPagination):
     # Defines the query parameter name for the page size (e.g., ?page_size=10)
@@ -7,4 +13,190 @@ class CustomPageNumberPagination(PageNumberPagination):
     # Sets the default number of items per page
     page_size = 10 
     # Allows a user to set a maximum page size (e.g., max 50 items)
-    max_page_size = 50
\ No newline at end of file
+    max_page_size = 50
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Keyset ("seek") pagination over a unique ordering such as (created_at, id).
+
+    Each page is a single indexed range read of page_size + 1 rows: there is no
+    COUNT(*) and no OFFSET, so deep pages cost the same as the first one.
+    Cursors are opaque, signed tokens holding the boundary row's key values.
+    Views can set ``cursor_ordering`` to change the key, e.g. ('created_at', 'id').
+    """
+    page_size_query_param = 'page_size'
+    page_size = 10
+    max_page_size = 50
+    ordering = ('-created_at', '-id')
+    cursor_salt = 'posts.pagination.KeysetCursorPagination'
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(getattr(view, 'cursor_ordering', self.ordering))
+
+    def get_window(self, queryset, request, view=None):
+        """
+        The unevaluated slice of page_size + 1 rows that paginate_queryset()
+        reads for this request, or None when pagination is off.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.cursor_query_param)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        self.position, self.reverse = self.decode_cursor(request)
+
+        selected = self.select_window(view)
+        if selected is not None:
+            return selected
+
+        # Walking backwards reads the preceding rows in inverted order
+        ordering = self.window_ordering()
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(seek_filter(ordering, self.position))
+        return queryset[:self.page_size + 1]
+
+    def window_ordering(self):
+        if self.reverse:
+            return tuple(_invert(field) for field in self.ordering)
+        return self.ordering
+
+    def select_window(self, view):
+        """
+        The window chosen by the view's get_keyset_window(position, reverse,
+        size), for views whose order is kept outside their queryset (the
+        materialized feed): an unordered queryset of at most ``size`` rows,
+        or None for the usual ORDER BY window. Asked once per request.
+        """
+        if not hasattr(self, '_selected_window'):
+            select = getattr(view, 'get_keyset_window', None)
+            self._selected_window = (
+                select(self.position, self.reverse, self.page_size + 1) if select else None
+            )
+        return self._selected_window
+
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self.get_window(queryset, request, view)
+        if window is None:
+            return None
+
+        results = list(window)
+        if self._selected_window is not None:
+            _sort(results, self.window_ordering())
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = self.encode_cursor(self._position(self.page[-1]), reverse=False)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        cursor = self.encode_cursor(self._position(self.page[0]), reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            payload = signing.loads(encoded, salt=self.cursor_salt)
+            values = payload['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                self.model._meta.get_field(_field_name(field)).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(payload.get('r'))
+
+    def encode_cursor(self, position, reverse=False):
+        payload = {'p': [_serialize(value) for value in position]}
+        if reverse:
+            payload['r'] = 1
+        return signing.dumps(payload, salt=self.cursor_salt, compress=True)
+
+    def _position(self, instance):
+        return [getattr(instance, _field_name(field)) for field in self.ordering]
+
+
+class CursorOrPageNumberPagination(KeysetCursorPagination):
+    """
+    Keyset pagination by default; requests that still send ?page= keep the
+    original page-number behaviour (with its count) for older clients.
+    """
+    page_query_param = 'page'
+    page_number_class = CustomPageNumberPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_number_paginator = None
+        if self.page_query_param in request.query_params:
+            self.page_number_paginator = self.page_number_class()
+            return self.page_number_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_window(self, queryset, request, view=None):
+        # A numbered page also reports the total count, which no window covers
+        if self.page_query_param in request.query_params:
+            return None
+        return super().get_window(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_html_context()
+        return super().get_html_context()
+
+
+def _field_name(field):
+    return field.lstrip('-')
+
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else '-' + field
+
+
+def _serialize(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _sort(objects, ordering):
+    """Sorts model instances in place the way ORDER BY ``ordering`` would."""
+    for field in reversed(ordering):
+        objects.sort(key=attrgetter(_field_name(field)), reverse=field.startswith('-'))
+
+
+def seek_filter(ordering, position):
+    """
+    Rows strictly after ``position`` in ``ordering``, i.e. the row-value
+    comparison (a, b) < (x, y) spelled as: a < x OR (a = x AND b < y).
+    """
+    condition = Q()
+    for index, field in enumerate(ordering):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{_field_name(field)}__{lookup}': position[index]})
+        for previous, value in zip(ordering[:index], position[:index]):
+            step &= Q(**{_field_name(previous): value})
+        condition |= step
+    return condition
@@ -12,4 +12,5 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
             return True
 
         # Write permissions are only allowed to the author of the post/comment
-        return obj.author == request.user
\ No newline at end of file
+        # (compare ids: the author row itself is not loaded)
+        return obj.author_id == request.user.pk
\ No newline at end of file
@@ -0,0 +1,136 @@
+# posts/response_cache.py
+"""
+Response cache for read endpoints.
+
+GET responses of the views using ResponseCacheMixin are stored in the default
+cache (local memory in development and tests, Redis in production), keyed by
+the absolute URL with its query string, the auth state and the current
+version of every *namespace* the response depends on, e.g. "posts" for the
+post list, "post:42" for one post, "comments:42" for its comment list.
+
+Nothing is ever deleted: writes bump the versions of the namespaces they
+affect (see posts/signals.py), so every key built afterwards is new and the
+superseded entries simply age out after RESPONSE_CACHE_TTL seconds. A version
+is bumped both at once and again when the transaction commits, so a reader
+that renders old data between the two cannot cache it under the new version.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+# Headers stored with an entry and replayed on hits
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+# Response data depends on user summaries (username, avatar) through this namespace
+USERS_NAMESPACE = 'users'
+
+
+def get_ttl():
+    return getattr(settings, 'RESPONSE_CACHE_TTL', 300)
+
+
+def _version_key(namespace):
+    return f'rc:ns:{namespace}'
+
+
+def _fresh_version():
+    # Never reuses a value a lost (evicted) version may have had
+    return time.time_ns()
+
+
+def get_versions(namespaces):
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def _bump(namespaces):
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+
+
+def invalidate(*namespaces):
+    """Makes every cached response that depends on ``namespaces`` unreachable."""
+    namespaces = set(namespaces)
+    _bump(namespaces)
+    transaction.on_commit(lambda: _bump(namespaces))
+
+
+def post_namespaces(post_ids):
+    """What a change to these posts (or their counters) invalidates."""
+    return ['posts', *(f'post:{post_id}' for post_id in post_ids)]
+
+
+class ResponseCacheMixin:
+    """
+    Caches list/retrieve responses of a view. Views name the namespaces a
+    response depends on in get_response_cache_namespaces(); returning None
+    skips the cache for that request.
+    """
+    # Serve cached responses to anonymous requests only
+    response_cache_anonymous_only = False
+
+    def get_response_cache_namespaces(self):
+        return None
+
+    def get_response_cache_key(self, request):
+        if request.method != 'GET' or not get_ttl():
+            return None
+        authenticated = request.user.is_authenticated
+        if authenticated and self.response_cache_anonymous_only:
+            return None
+        namespaces = self.get_response_cache_namespaces()
+        if namespaces is None:
+            return None
+        namespaces = [USERS_NAMESPACE, *namespaces]
+        versions = '.'.join(str(version) for version in get_versions(namespaces))
+        url = hashlib.md5(request.build_absolute_uri().encode(), usedforsecurity=False).hexdigest()
+        return f"rc:{type(self).__name__}:{self.action}:{'user' if authenticated else 'anon'}:{versions}:{url}"
+
+    def cached_response(self, request, respond):
+        key = self.get_response_cache_key(request)
+        if key is None:
+            return respond()
+
+        entry = cache.get(key)
+        if entry is not None:
+            response = get_conditional_response(
+                request, etag=entry['headers'].get('ETag'), last_modified=entry['last_modified']
+            )
+            response = response or Response(entry['data'], status=200)
+            for header, value in entry['headers'].items():
+                response[header] = value
+            return response
+
+        response = respond()
+        if response.status_code == 200:
+            headers = {header: response[header] for header in CACHED_HEADERS if header in response}
+            # Like ConditionalGetMixin, only single objects honour If-Modified-Since
+            last_modified = None
+            if self.action == 'retrieve' and 'Last-Modified' in response:
+                last_modified = parse_http_date_safe(response['Last-Modified'])
+            cache.set(key, {'data': response.data, 'headers': headers, 'last_modified': last_modified}, get_ttl())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(ResponseCacheMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(ResponseCacheMixin, self).retrieve(request, *args, **kwargs)
+        )
@@ -0,0 +1,177 @@
+# posts/search.py
+"""
+Full-text search over post titles and content.
+
+Each post has a search document maintained next to it, in whichever form the
+database supports:
+
+* SQLite: an FTS5 virtual table ``posts_post_fts`` (porter stemming, prefix
+  indexes) ranked with bm25();
+* PostgreSQL: a ``posts_post_search`` table of weighted tsvectors with a GIN
+  index, ranked with ts_rank_cd().
+
+Both are created by migration 0007 and kept current by the signal handlers in
+posts/signals.py (create/update/delete); ``manage.py reindex_posts`` rebuilds
+them. Every query term is matched as a prefix, and titles weigh more than
+content. On any other database, or an SQLite build without FTS5, search falls
+back to unranked icontains filtering.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+FTS_TABLE = 'posts_post_fts'
+SEARCH_TABLE = 'posts_post_search'
+# Terms beyond this are ignored, which keeps match expressions cheap
+MAX_TERMS = 8
+
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def get_config():
+    """PostgreSQL text search configuration (stemming language)."""
+    return getattr(settings, 'SEARCH_CONFIG', 'english')
+
+
+# SQLite alias -> whether its database has the FTS5 table; cleared after migrate
+_fts_tables = {}
+
+
+def backend():
+    """'postgresql', 'sqlite' (FTS5), or None when only the fallback is available."""
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        if connection.alias not in _fts_tables:
+            with connection.cursor() as cursor:
+                _fts_tables[connection.alias] = FTS_TABLE in connection.introspection.table_names(cursor)
+        return 'sqlite' if _fts_tables[connection.alias] else None
+    return None
+
+
+def reset_backend(**kwargs):
+    """Forgets the FTS5 detection; connected to post_migrate (posts/apps.py)."""
+    _fts_tables.clear()
+
+
+def terms(query):
+    return TERM_PATTERN.findall(query.lower())[:MAX_TERMS]
+
+
+def _match_expression(words):
+    """Every word as a prefix term, in the dialect of the active backend."""
+    if backend() == 'postgresql':
+        return ' & '.join(f'{word}:*' for word in words)
+    # FTS5: quoted strings cannot be mistaken for operators or column filters
+    return ' '.join('"%s"*' % word.replace('"', '') for word in words)
+
+
+def _matching_ids_sql():
+    if backend() == 'postgresql':
+        return (f'SELECT post_id FROM {SEARCH_TABLE} '
+                'WHERE document @@ to_tsquery(%s::regconfig, %s)', [get_config()])
+    return f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', []
+
+
+def filter_queryset(queryset, query):
+    """Posts matching ``query``, keeping the queryset's own ordering."""
+    words = terms(query)
+    if not words:
+        return queryset
+    if backend() is None:
+        condition = Q()
+        for word in words:
+            condition &= Q(title__icontains=word) | Q(content__icontains=word)
+        return queryset.filter(condition)
+    sql, params = _matching_ids_sql()
+    return queryset.filter(pk__in=RawSQL(sql, [*params, _match_expression(words)]))
+
+
+def ranked_ids(query, limit):
+    """Ids of the best ``limit`` matches for ``query``, best first."""
+    words = terms(query)
+    if not words:
+        return []
+    kind = backend()
+    if kind is None:
+        from .models import Post
+
+        return list(filter_queryset(Post.objects.order_by('-created_at', '-id'), query)
+                    .values_list('pk', flat=True)[:limit])
+
+    match = _match_expression(words)
+    if kind == 'postgresql':
+        sql = (f'SELECT post_id FROM {SEARCH_TABLE}, to_tsquery(%s::regconfig, %s) query '
+               'WHERE document @@ query ORDER BY ts_rank_cd(document, query) DESC, post_id DESC LIMIT %s')
+        params = [get_config(), match, limit]
+    else:
+        # bm25() is smaller for better matches; titles count double
+        sql = (f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+               f'ORDER BY bm25({FTS_TABLE}, 2.0, 1.0), rowid DESC LIMIT %s')
+        params = [match, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _document_sql():
+    return ("setweight(to_tsvector(%s::regconfig, coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector(%s::regconfig, coalesce(content, '')), 'B')")
+
+
+def index_posts(post_ids):
+    """(Re)writes the search documents of ``post_ids`` from the posts table."""
+    post_ids = list(post_ids)
+    kind = backend()
+    if not post_ids or kind is None:
+        return
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        if kind == 'postgresql':
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (post_id, document) '
+                f'SELECT id, {_document_sql()} FROM posts_post WHERE id IN ({placeholders}) '
+                f'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document',
+                [get_config(), get_config(), *post_ids],
+            )
+        else:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', post_ids)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, content) '
+                f'SELECT id, title, content FROM posts_post WHERE id IN ({placeholders})',
+                post_ids,
+            )
+
+
+def remove_posts(post_ids):
+    post_ids = list(post_ids)
+    kind = backend()
+    if not post_ids or kind is None:
+        return
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    table, column = (SEARCH_TABLE, 'post_id') if kind == 'postgresql' else (FTS_TABLE, 'rowid')
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', post_ids)
+
+
+def remove_orphans():
+    """Drops documents whose post no longer exists; returns how many."""
+    kind = backend()
+    if kind is None:
+        return 0
+    table, column = (SEARCH_TABLE, 'post_id') if kind == 'postgresql' else (FTS_TABLE, 'rowid')
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} NOT IN (SELECT id FROM posts_post)')
+        return cursor.rowcount
+
+
+class PostSearchFilter(SearchFilter):
+    """?search= for post lists, answered from the search index."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        return filter_queryset(queryset, query) if query.strip() else queryset
@@ -1,12 +1,16 @@
 # posts/serializers.py
+from django.conf import settings
 from rest_framework import serializers
 from .models import Post, Comment
 from accounts.serializers import UserProfileSerializer # Reuse the profile serializer
+from accounts.expansion import UserExpansionSerializerMixin
 
 # Comment Serializer (Must come first as it's used by the Post serializer)
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(UserExpansionSerializerMixin, serializers.ModelSerializer):
     # Use a read-only field to show the author's username instead of ID
-    author_username = serializers.ReadOnlyField(source='author.username')
+    # (from the request's user expansion, not a per-comment author lookup)
+    author_username = serializers.SerializerMethodField()
+    expandable_user_fields = ('author',)
     
     class Meta:
         model = Comment
@@ -14,21 +18,75 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ('id', 'post', 'author', 'author_username', 'content', 'created_at', 'updated_at')
         read_only_fields = ('author', 'post') # Author and post are set automatically
 
-class PostSerializer(serializers.ModelSerializer):
-    # Nested field to show the author's username
-    author_username = serializers.ReadOnlyField(source='author.username')
-    # Nested representation of comments (read-only for list/detail views)
-    comments = CommentSerializer(many=True, read_only=True)
-    # Count of comments
-    comments_count = serializers.SerializerMethodField()
+    def get_author_username(self, obj):
+        return self.get_user_summary(obj.author_id)['username']
+
+class PostSerializer(UserExpansionSerializerMixin, serializers.ModelSerializer):
+    # Nested field to show the author's username (see accounts/expansion.py)
+    author_username = serializers.SerializerMethodField()
+    # Preview of the latest comments only; the full list lives at comments_url
+    comments = serializers.SerializerMethodField()
+    # Stored counters (see Post.likes_count / Post.comments_count)
+    likes_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
+    # Link to the paginated posts/<post_pk>/comments/ endpoint
+    comments_url = serializers.HyperlinkedIdentityField(
+        view_name='post-comments-list', lookup_url_kwarg='post_pk'
+    )
     
     class Meta:
         model = Post
         fields = (
             'id', 'author', 'author_username', 'title', 'content', 
-            'comments', 'comments_count', 'created_at', 'updated_at'
+            'comments', 'comments_count', 'likes_count', 'comments_url', 'created_at', 'updated_at'
         )
         read_only_fields = ('author',) # Author is set automatically
+    expandable_user_fields = ('author',)
+
+    def get_author_username(self, obj):
+        return self.get_user_summary(obj.author_id)['username']
+
+    def get_comments(self, obj):
+        # Prefetched by Post.objects.with_list_data(); query directly otherwise
+        preview = getattr(obj, 'comment_preview', None)
+        if preview is None:
+            size = self.context.get('comment_preview_size', settings.POST_COMMENT_PREVIEW_SIZE)
+            preview = Comment.objects.latest_per_post(size).filter(post=obj) if size else []
+        return CommentSerializer(preview, many=True, context=self.context).data
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Save only the edited columns so concurrent counter updates survive
+        instance.save(update_fields=[*validated_data, 'updated_at', 'activity_at'])
+        return instance
+
+
+class BatchLikeSerializer(serializers.Serializer):
+    """Payload of the batch like endpoint; bounded so one call stays cheap."""
+    MAX_POSTS = 100
+
+    like = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    unlike = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+
+    def validate(self, data):
+        if set(data['like']) & set(data['unlike']):
+            raise serializers.ValidationError("A post cannot be both liked and unliked.")
+        if len(set(data['like']) | set(data['unlike'])) > self.MAX_POSTS:
+            raise serializers.ValidationError(f"At most {self.MAX_POSTS} posts per request.")
+        return data
+
+
+class FeedSinceQuerySerializer(serializers.Serializer):
+    """?watermark= from the previous sync and ?ids= of the posts the client holds."""
+    watermark = serializers.CharField(required=False)
+    ids = serializers.CharField(required=False, default='')
 
-    def get_comments_count(self, obj):
-        return obj.comments.count()
\ No newline at end of file
+    def validate_ids(self, value):
+        try:
+            ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+        except ValueError:
+            raise serializers.ValidationError("Must be a comma-separated list of post ids.")
+        if len(ids) > settings.FEED_SYNC_MAX_IDS:
+            raise serializers.ValidationError(f"At most {settings.FEED_SYNC_MAX_IDS} ids per request.")
+        return ids
@@ -0,0 +1,82 @@
+# posts/signals.py
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import response_cache, search, suggestions
+from .models import Comment, Like, Post, Suggestion
+
+SEARCHED_FIELDS = {'title', 'content'}
+SUGGESTED_USER_FIELDS = {'username', 'is_active'}
+# User fields that appear in the summaries embedded in posts and comments
+SUMMARY_USER_FIELDS = {'username', 'is_active', 'profile_picture', 'profile_picture_variants'}
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    # Counter-only saves (likes, comments) leave the search document alone
+    if update_fields is None or SEARCHED_FIELDS & set(update_fields):
+        search.index_posts([instance.pk])
+    if update_fields is None or 'title' in update_fields:
+        suggestions.index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_posts([instance.pk])
+    suggestions.remove(Suggestion.KIND_POST, [instance.pk])
+
+
+@receiver(post_save, sender=get_user_model())
+def index_user(sender, instance, update_fields=None, **kwargs):
+    # Counter and profile edits do not change what is suggested
+    if update_fields is None or SUGGESTED_USER_FIELDS & set(update_fields):
+        suggestions.index_users([instance])
+
+
+@receiver(post_delete, sender=get_user_model())
+def unindex_user(sender, instance, **kwargs):
+    suggestions.remove(Suggestion.KIND_USER, [instance.pk])
+
+
+# --- Response cache invalidation (posts/response_cache.py) ---
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_responses(sender, instance, **kwargs):
+    namespaces = response_cache.post_namespaces([instance.pk])
+    if kwargs['signal'] is post_delete:
+        namespaces.append(f'comments:{instance.pk}')
+    response_cache.invalidate(*namespaces)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_responses(sender, instance, **kwargs):
+    # The post embeds a preview and a count of its comments
+    response_cache.invalidate(f'comments:{instance.post_id}', *response_cache.post_namespaces([instance.post_id]))
+
+
+@receiver([post_save, post_delete], sender=Like)
+def invalidate_like_responses(sender, instance, **kwargs):
+    response_cache.invalidate(*response_cache.post_namespaces([instance.post_id]))
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def invalidate_liked_post_responses(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        post_ids = [instance.pk]
+    elif pk_set is not None:
+        post_ids = pk_set
+    else:
+        # user.liked_posts.clear(): the posts are gone from the relation already
+        post_ids = []
+        response_cache.invalidate('posts')
+    response_cache.invalidate(*response_cache.post_namespaces(post_ids))
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_summary_responses(sender, instance, created, update_fields=None, **kwargs):
+    # New users have nothing to show yet; logins and bio edits show nowhere
+    if not created and (update_fields is None or SUMMARY_USER_FIELDS & set(update_fields)):
+        response_cache.invalidate(response_cache.USERS_NAMESPACE)
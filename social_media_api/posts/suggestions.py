@@ -0,0 +1,149 @@
+# posts/suggestions.py
+"""
+Search-as-you-type suggestions for post titles and usernames.
+
+Every word of a title or username is stored as its edge n-grams ("gar",
+"gard", ... up to SUGGEST_MAX_PREFIX characters) in the Suggestion table,
+together with a copy of the label and a popularity weight. A lookup is then a
+single equality match on (prefix, kind) ordered by the same index, which
+stays a handful of index pages however many rows the table holds. Rows are
+rewritten by the signal handlers in posts/signals.py whenever a title or
+username changes, and the like paths copy a post's new likes_count into its
+rows' weight (refresh_post_weights); ``manage.py rebuild_suggestions``
+rebuilds them all.
+
+Responses depend only on the prefix, so they are cached per prefix for
+SUGGEST_CACHE_TTL seconds and may be cached by clients and proxies as well.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from .models import Post, Suggestion
+from .search import TERM_PATTERN, terms
+
+MIN_PREFIX = 1
+
+
+def get_max_prefix():
+    return getattr(settings, 'SUGGEST_MAX_PREFIX', 15)
+
+
+def edge_ngrams(label):
+    """Every distinct leading substring of every word of ``label``."""
+    max_prefix = get_max_prefix()
+    prefixes = set()
+    for word in TERM_PATTERN.findall(label.lower()):
+        for length in range(MIN_PREFIX, min(len(word), max_prefix) + 1):
+            prefixes.add(word[:length])
+    return prefixes
+
+
+def _rows(kind, object_id, label, weight):
+    return [
+        Suggestion(prefix=prefix, kind=kind, object_id=object_id, label=label, weight=weight)
+        for prefix in edge_ngrams(label)
+    ]
+
+
+def _replace(kind, objects):
+    """Rewrites the rows of ``objects``: (object_id, label, weight) tuples."""
+    objects = list(objects)
+    with transaction.atomic():
+        Suggestion.objects.filter(kind=kind, object_id__in=[obj[0] for obj in objects]).delete()
+        Suggestion.objects.bulk_create(
+            [row for obj in objects for row in _rows(kind, *obj)], batch_size=1000
+        )
+
+
+def index_posts(posts):
+    _replace(Suggestion.KIND_POST, ((post.pk, post.title, post.likes_count) for post in posts))
+
+
+def refresh_post_weights(post_ids):
+    """Sets the weight of the posts' rows to their current likes_count."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    Suggestion.objects.filter(kind=Suggestion.KIND_POST, object_id__in=post_ids).update(
+        weight=Subquery(Post.objects.filter(pk=OuterRef('object_id')).values('likes_count')[:1])
+    )
+
+
+def index_users(users):
+    users = list(users)
+    # Deactivated accounts are not suggested
+    _replace(Suggestion.KIND_USER, (
+        (user.pk, user.username, user.followers_count) for user in users if user.is_active
+    ))
+    remove(Suggestion.KIND_USER, [user.pk for user in users if not user.is_active])
+
+
+def remove(kind, object_ids):
+    Suggestion.objects.filter(kind=kind, object_id__in=list(object_ids)).delete()
+
+
+def rebuild(batch_size=1000):
+    """Rebuilds the whole index in primary-key batches; returns rows written per kind."""
+    written = {}
+    for kind, queryset, indexer in (
+        (Suggestion.KIND_POST, Post.objects.only('id', 'title', 'likes_count'), index_posts),
+        (Suggestion.KIND_USER, get_user_model().objects.only(
+            'id', 'username', 'followers_count', 'is_active'), index_users),
+    ):
+        Suggestion.objects.filter(kind=kind).delete()
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            indexer(batch)
+            last_id = batch[-1].pk
+        written[kind] = Suggestion.objects.filter(kind=kind).count()
+    return written
+
+
+def _lookup(kind, words, limit):
+    # The longest word is the most selective key; the other words (and the
+    # remainder of a word longer than the stored prefixes) filter the few
+    # rows that range read returns
+    key = max(words, key=len)
+    queryset = Suggestion.objects.filter(prefix=key[:get_max_prefix()], kind=kind)
+    for word in words:
+        if word != key or len(word) > get_max_prefix():
+            queryset = queryset.filter(label__icontains=word)
+    return list(
+        queryset.order_by('-weight', '-object_id').values('object_id', 'label')[:limit]
+    )
+
+
+def cache_key(query):
+    digest = hashlib.sha256(' '.join(terms(query)).encode()).hexdigest()
+    return f'suggest:{digest}'
+
+
+def suggest(query):
+    """
+    {'posts': [{id, title}], 'users': [{id, username}]} for the typed
+    ``query``, best first; served from the per-prefix cache when possible.
+    """
+    words = terms(query)
+    if not words:
+        return {'posts': [], 'users': []}
+    limit = getattr(settings, 'SUGGEST_LIMIT', 8)
+
+    key = cache_key(query)
+    result = cache.get(key)
+    if result is None:
+        result = {
+            'posts': [{'id': row['object_id'], 'title': row['label']}
+                      for row in _lookup(Suggestion.KIND_POST, words, limit)],
+            'users': [{'id': row['object_id'], 'username': row['label']}
+                      for row in _lookup(Suggestion.KIND_USER, words, limit)],
+        }
+        cache.set(key, result, getattr(settings, 'SUGGEST_CACHE_TTL', 30))
+    return result
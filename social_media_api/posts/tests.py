@@ -1,3 +1,647 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from accounts import graph
+from notifications.models import Notification
+
+from . import search, timeline, views
+from .models import Comment, Like, Post, TimelineEntry
+
+User = get_user_model()
+
+# Plain HTTP test client and notifications written inside the request
+TEST_SETTINGS = {'SECURE_SSL_REDIRECT': False, 'NOTIFICATION_DISPATCH_MODE': 'sync'}
+
+
+@override_settings(**TEST_SETTINGS)
+class TimelineTests(APITestCase):
+    def setUp(self):
+        # Follows go through the cached follow graph
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.author = User.objects.create_user(username='author', password='pass12345')
+
+    def follow(self, user, target):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse('follow-toggle', args=[target.pk]))
+
+    def create_post(self, author, title='Hello'):
+        self.client.force_authenticate(author)
+        response = self.client.post(reverse('post-list'), {'title': title, 'content': 'Body'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Post.objects.get(pk=response.data['id'])
+
+    def feed_ids(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('feed'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        self.follow(self.reader, self.author)
+        post = self.create_post(self.author)
+
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, post=post).exists())
+        self.assertEqual(self.feed_ids(self.reader), [post.pk])
+
+    def test_follow_backfills_and_unfollow_purges(self):
+        older = self.create_post(self.author, 'Older')
+        newer = self.create_post(self.author, 'Newer')
+
+        self.follow(self.reader, self.author)
+        self.assertEqual(self.feed_ids(self.reader), [newer.pk, older.pk])
+
+        self.follow(self.reader, self.author)
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader).exists())
+        self.assertEqual(self.feed_ids(self.reader), [])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_high_fanout_author_is_read_on_demand(self):
+        self.follow(self.reader, self.author)
+        post = self.create_post(self.author)
+
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_ids(self.reader), [post.pk])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2)
+    def test_cursor_pages_merge_timeline_and_high_fanout_authors(self):
+        celebrity = User.objects.create_user(username='celebrity')
+        fan = User.objects.create_user(username='fan')
+        self.follow(self.reader, self.author)
+        self.follow(self.reader, celebrity)
+        self.follow(fan, celebrity)
+        posts = [self.create_post(author, f'Post {i}') for i in range(3) for author in (self.author, celebrity)]
+        newest_first = [post.pk for post in reversed(posts)]
+
+        self.client.force_authenticate(self.reader)
+        url, seen, pages = reverse('feed') + '?page_size=4', [], []
+        while url:
+            pages.append(self.client.get(url).data)
+            seen += [item['id'] for item in pages[-1]['results']]
+            url = pages[-1]['next']
+        self.assertEqual(seen, newest_first)
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.reader).count(), 3)
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual([item['id'] for item in response.data['results']], newest_first[:4])
+
+    @override_settings(TIMELINE_MAX_LENGTH=2, TIMELINE_TRIM_INTERVAL=1)
+    def test_timelines_are_trimmed_to_their_newest_entries(self):
+        self.follow(self.reader, self.author)
+        posts = [self.create_post(self.author, f'Post {i}') for i in range(4)]
+
+        entries = TimelineEntry.objects.filter(owner=self.reader)
+        self.assertEqual(sorted(entries.values_list('post_id', flat=True)), [posts[2].pk, posts[3].pk])
+
+
+@override_settings(**TEST_SETTINGS)
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='pass12345')
+        self.posts = [
+            Post.objects.create(author=self.user, title=f'Post {i}', content='Body')
+            for i in range(5)
+        ]
+        self.newest_first = [post.pk for post in reversed(self.posts)]
+
+    def test_cursor_walk_is_stable_in_both_directions(self):
+        url = reverse('post-list') + '?page_size=2'
+        seen, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages.append(response.data)
+            seen += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, self.newest_first)
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual([item['id'] for item in response.data['results']], self.newest_first[2:4])
+
+    def test_page_number_requests_keep_legacy_shape(self):
+        response = self.client.get(reverse('post-list'), {'page': 2, 'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual([item['id'] for item in response.data['results']], self.newest_first[2:4])
+
+    def test_tampered_cursor_is_rejected(self):
+        response = self.client.get(reverse('post-list'), {'cursor': 'not-a-signed-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(**TEST_SETTINGS)
+class ListQueryCountTests(APITestCase):
+    """Regression guard: list endpoints must not issue per-row queries."""
+
+    # One aggregate for the page's validators (posts/conditional.py), one query
+    # for the page of posts, one prefetch for the comment previews and, on a
+    # cold cache, one batched lookup of every author on the page
+    QUERIES_PER_PAGE = 4
+    # The feed first finds the followed high-fanout authors and reads the
+    # page's keys from the timeline index (posts/timeline.py)
+    FEED_QUERIES_PER_PAGE = QUERIES_PER_PAGE + 2
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        for i in range(6):
+            author = User.objects.create_user(username=f'author{i}')
+            author.followers.add(self.reader)
+            post = Post.objects.create(author=author, title=f'Post {i}', content='Body', comments_count=3)
+            TimelineEntry.objects.create(owner=self.reader, post=post, created_at=post.created_at)
+            for j in range(3):
+                commenter = User.objects.create_user(username=f'c{i}_{j}')
+                Comment.objects.create(post=post, author=commenter, content='Nice')
+
+    def test_post_list_query_count_is_constant(self):
+        with self.assertNumQueries(self.QUERIES_PER_PAGE):
+            response = self.client.get(reverse('post-list'))
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(response.data['results'][0]['comments_count'], 3)
+
+    def test_feed_query_count_is_constant(self):
+        self.client.force_authenticate(self.reader)
+        # The followed ids are read from the cached follow graph, never the join table
+        graph.following_ids(self.reader.pk)
+        with self.assertNumQueries(self.FEED_QUERIES_PER_PAGE) as captured:
+            response = self.client.get(reverse('feed'))
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertFalse([query for query in captured if 'accounts_customuser_followers' in query['sql']])
+
+    @override_settings(RESPONSE_CACHE_TTL=0, POST_COMMENT_PREVIEW_MAX=10)
+    def test_post_detail_query_count_does_not_grow_with_comments(self):
+        post = Post.objects.order_by('pk').first()
+        url = reverse('post-detail', args=[post.pk])
+        queries = []
+        for extra in range(2):
+            for i in range(4 * extra):
+                Comment.objects.create(post=post, author=User.objects.create_user(username=f'late{i}'), content='Hi')
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url, {'comments': 10})
+            queries.append(len(captured))
+        self.assertEqual(len(response.data['comments']), 7)
+        # Validators, the post, its comment preview and one batched user lookup
+        self.assertEqual(queries, [4, 4])
+
+    def test_cached_authors_are_not_reloaded(self):
+        self.client.get(reverse('post-list'))
+        with self.assertNumQueries(self.QUERIES_PER_PAGE - 1):
+            response = self.client.get(reverse('post-list'), {'expand': 'author'})
+        post = response.data['results'][0]
+        self.assertEqual(post['author']['username'], post['author_username'])
+        self.assertEqual(set(post['author']), {'id', 'username', 'avatar'})
+        self.assertTrue(post['comments'][0]['author_username'].startswith('c'))
+
+
+@override_settings(**TEST_SETTINGS, POST_COMMENT_PREVIEW_MAX=4)
+class CommentPreviewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer')
+        self.post = Post.objects.create(author=self.user, title='Viral', content='Body', comments_count=6)
+        self.comments = [
+            Comment.objects.create(post=self.post, author=self.user, content=f'Comment {i}')
+            for i in range(6)
+        ]
+
+    def get_post(self, **params):
+        response = self.client.get(reverse('post-list'), params)
+        return response.data['results'][0]
+
+    def test_list_embeds_latest_comments_only(self):
+        data = self.get_post(comments=2)
+        self.assertEqual([c['id'] for c in data['comments']], [c.pk for c in self.comments[-2:]])
+        self.assertEqual(data['comments_count'], 6)
+        self.assertTrue(data['comments_url'].endswith(f'/api/posts/{self.post.pk}/comments/'))
+
+    def test_preview_size_is_capped_and_can_be_disabled(self):
+        self.assertEqual(len(self.get_post(comments=100)['comments']), 4)
+        self.assertEqual(self.get_post(comments=0)['comments'], [])
+
+
+@override_settings(**TEST_SETTINGS)
+class CounterTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.fan = User.objects.create_user(username='fan')
+        self.post = Post.objects.create(author=self.author, title='Counted', content='Body')
+        self.client.force_authenticate(self.fan)
+
+    def test_like_toggle_maintains_stored_counter(self):
+        url = reverse('post-toggle-like', args=[self.post.pk])
+        self.assertEqual(self.client.post(url).data['likes_count'], 1)
+        self.assertEqual(self.client.post(url).data['likes_count'], 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_comment_create_and_delete_maintain_stored_counter(self):
+        url = reverse('post-comments-list', args=[self.post.pk])
+        comment_id = self.client.post(url, {'content': 'Hi'}).data['id']
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+        self.client.delete(reverse('post-comments-detail', args=[self.post.pk, comment_id]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_comments_on_a_post_coalesce_into_one_notification(self):
+        url = reverse('post-comments-list', args=[self.post.pk])
+        self.client.post(url, {'content': 'First'})
+        self.client.force_authenticate(User.objects.create_user(username='second'))
+        self.client.post(url, {'content': 'Second'})
+
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual((notification.target, notification.actor_count), (self.post, 2))
+
+    def test_recount_repairs_drift(self):
+        Comment.objects.create(post=self.post, author=self.fan, content='Untracked')
+        self.author.followers.add(self.fan)
+
+        call_command('recount', batch_size=1, stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.fan.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual((self.author.followers_count, self.fan.following_count), (1, 1))
+
+
+@override_settings(**TEST_SETTINGS)
+class LikeTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.fan = User.objects.create_user(username='fan')
+        self.posts = [
+            Post.objects.create(author=self.author, title=f'Post {i}', content='Body')
+            for i in range(3)
+        ]
+        self.client.force_authenticate(self.fan)
+
+    def test_toggle_writes_only_the_like_table(self):
+        post = self.posts[0]
+        self.client.post(reverse('post-toggle-like', args=[post.pk]))
+        self.assertEqual(list(post.likes.all()), [self.fan])
+        self.assertEqual(Like.objects.filter(post=post).count(), 1)
+
+        self.client.post(reverse('post-toggle-unlike', args=[post.pk]))
+        self.assertFalse(Like.objects.exists())
+
+    def test_batch_like_is_idempotent(self):
+        url = reverse('post-batch-like')
+        ids = [post.pk for post in self.posts]
+
+        response = self.client.post(url, {'like': ids}, format='json')
+        self.assertEqual(response.data['liked'], ids)
+        response = self.client.post(url, {'like': ids}, format='json')
+        self.assertEqual(response.data['liked'], [])
+        self.assertEqual(Like.objects.count(), 3)
+
+        response = self.client.post(url, {'unlike': ids[:2]}, format='json')
+        self.assertEqual(response.data['unliked'], ids[:2])
+        self.assertEqual(response.data['likes_count'], {ids[0]: 0, ids[1]: 0})
+        self.assertEqual(list(Post.objects.filter(likes_count=1).values_list('pk', flat=True)), [ids[2]])
+
+
+    def test_batch_like_counts_only_its_own_inserts(self):
+        raced = self.posts[0]
+        insert_like = views._insert_like
+
+        def concurrent_like(user, post_id):
+            if post_id == raced.pk:
+                # A toggle_like from another request lands first
+                Like.objects.create(user=user, post=raced)
+                Post.objects.filter(pk=raced.pk).adjust_counter('likes_count', 1)
+            return insert_like(user, post_id)
+
+        ids = [post.pk for post in self.posts]
+        with mock.patch.object(views, '_insert_like', concurrent_like):
+            response = self.client.post(reverse('post-batch-like'), {'like': ids}, format='json')
+        self.assertEqual(response.data['liked'], ids[1:])
+        self.assertEqual(response.data['likes_count'], {ids[1]: 1, ids[2]: 1})
+        raced.refresh_from_db()
+        self.assertEqual(raced.likes_count, 1)
+
+class HotQueryIndexTests(TestCase):
+    def test_hot_querysets_do_not_sequentially_scan(self):
+        author = User.objects.create_user(username='author')
+        User.objects.create_user(username='reader').following.add(author)
+        Post.objects.create(author=author, title='Post', content='Body')
+
+        call_command('explain_hot_queries', user='reader', fail=True, stdout=StringIO())
+
+    def test_sorting_hot_queryset_fails(self):
+        reader = User.objects.create_user(username='reader')
+        sorting = {'feed (all posts)': timeline.feed_queryset(reader)[:10]}
+        with mock.patch('posts.management.commands.explain_hot_queries.hot_querysets', return_value=sorting):
+            with self.assertRaisesMessage(CommandError, 'feed (all posts)'):
+                call_command('explain_hot_queries', user='reader', fail=True, stdout=StringIO())
+
+
+@override_settings(**TEST_SETTINGS)
+class SearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.in_content = Post.objects.create(author=self.author, title='Weekend',
+                                              content='Notes on gardening and compost')
+        self.in_title = Post.objects.create(author=self.author, title='Gardening basics',
+                                            content='Where to start')
+        Post.objects.create(author=self.author, title='Unrelated', content='Cooking')
+
+    def search(self, q):
+        response = self.client.get(reverse('post-search'), {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['id'] for post in response.data['results']]
+
+    def test_title_matches_rank_first_and_words_match_as_prefixes(self):
+        self.assertEqual(self.search('garden'), [self.in_title.pk, self.in_content.pk])
+        self.assertEqual(self.search('gard comp'), [self.in_content.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.in_title.title = 'Composting'
+        self.in_title.save()
+        self.in_content.delete()
+        self.assertEqual(self.search('garden'), [])
+        self.assertEqual(self.search('compost'), [self.in_title.pk])
+
+    def test_list_search_param_uses_the_index(self):
+        response = self.client.get(reverse('post-list'), {'search': 'gardening'})
+        self.assertEqual({post['id'] for post in response.data['results']},
+                         {self.in_title.pk, self.in_content.pk})
+
+    def test_empty_query_is_rejected(self):
+        response = self.client.get(reverse('post-search'), {'q': '  '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reindex_rebuilds_missing_documents(self):
+        # update() bypasses the signals, leaving the index stale
+        Post.objects.filter(pk=self.in_title.pk).update(title='Beekeeping')
+        self.assertEqual(self.search('beekeeping'), [])
+        out = StringIO()
+        call_command('reindex_posts', batch_size=2, stdout=out)
+        self.assertIn('Reindexed 3 post(s)', out.getvalue())
+        self.assertEqual(self.search('beekeeping'), [self.in_title.pk])
+
+    def test_missing_fts_table_is_detected_once(self):
+        self.addCleanup(search.reset_backend)
+        search.reset_backend()
+        with mock.patch.object(connection.introspection, 'table_names', return_value=[]) as table_names:
+            self.assertIsNone(search.backend())
+            Post.objects.create(author=self.author, title='No index', content='Body')
+            self.assertEqual(table_names.call_count, 1)
+
+
+@override_settings(**TEST_SETTINGS)
+class SuggestionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.popular = User.objects.create_user(username='gardener', followers_count=50)
+        self.other = User.objects.create_user(username='garfield')
+        self.post = Post.objects.create(author=self.other, title='Garden party tonight', content='Body')
+
+    def suggest(self, q):
+        response = self.client.get(reverse('suggest'), {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_prefix_matches_posts_and_users_by_weight(self):
+        response = self.suggest('Gar')
+        self.assertEqual([user['username'] for user in response.data['users']], ['gardener', 'garfield'])
+        self.assertEqual(response.data['posts'], [{'id': self.post.pk, 'title': 'Garden party tonight'}])
+        self.assertIn('max-age=30', response['Cache-Control'])
+        self.assertEqual(self.suggest('party gard').data['posts'][0]['id'], self.post.pk)
+
+    def test_index_follows_writes(self):
+        self.post.title = 'Picnic'
+        self.post.save()
+        self.other.is_active = False
+        self.other.save(update_fields=['is_active'])
+        self.popular.delete()
+        response = self.suggest('gar')
+        self.assertEqual(response.data, {'posts': [], 'users': []})
+        self.assertEqual(self.suggest('pic').data['posts'][0]['id'], self.post.pk)
+
+    def test_likes_reorder_post_suggestions(self):
+        newer = Post.objects.create(author=self.other, title='Garden tools', content='Body')
+        self.assertEqual([post['id'] for post in self.suggest('garden').data['posts']], [newer.pk, self.post.pk])
+
+        cache.clear()
+        self.client.force_authenticate(self.popular)
+        self.client.post(reverse('post-toggle-like', args=[self.post.pk]))
+        self.assertEqual([post['id'] for post in self.suggest('garden').data['posts']], [self.post.pk, newer.pk])
+
+    def test_answers_are_cached_per_prefix(self):
+        self.suggest('gard')
+        with self.assertNumQueries(0):
+            response = self.suggest('  GARD ')
+        self.assertEqual(len(response.data['users']), 1)
+
+    def test_rebuild_restores_bypassed_writes(self):
+        Post.objects.filter(pk=self.post.pk).update(title='Harvest')
+        call_command('rebuild_suggestions', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.suggest('harv').data['posts'][0]['id'], self.post.pk)
+        self.assertEqual(self.suggest('garden').data['posts'], [])
+
+
+@override_settings(**TEST_SETTINGS, RESPONSE_CACHE_TTL=0)
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.posts = [
+            Post.objects.create(author=self.author, title=f'Post {i}', content='Body') for i in range(3)
+        ]
+        self.comment = Comment.objects.create(post=self.posts[0], author=self.author, content='First')
+
+    def assertRevalidates(self, url, change, queries=1, **params):
+        response = self.client.get(url, params)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        change()
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_post_list_changes_with_counters_and_comment_edits(self):
+        url = reverse('post-list')
+        self.assertRevalidates(url, lambda: Post.objects.filter(pk=self.posts[1].pk).adjust_counter('likes_count', 1))
+        self.client.force_authenticate(self.author)
+        comment_url = reverse('post-comments-detail', args=[self.posts[0].pk, self.comment.pk])
+        self.assertRevalidates(url, lambda: self.client.patch(comment_url, {'content': 'Edited'}))
+
+    def test_post_list_changes_when_a_post_leaves_the_page(self):
+        self.assertRevalidates(reverse('post-list'), self.posts[1].delete)
+
+    def test_post_detail_honours_if_modified_since(self):
+        url = reverse('post-detail', args=[self.posts[0].pk])
+        response = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertRevalidates(url, lambda: self.posts[0].save())
+
+    def test_comment_list_and_feed(self):
+        comments_url = reverse('post-comments-list', args=[self.posts[0].pk])
+        self.assertRevalidates(comments_url, lambda: Comment.objects.create(
+            post=self.posts[0], author=self.reader, content='Second'))
+        self.client.force_authenticate(self.reader)
+        self.client.post(reverse('follow-toggle', args=[self.author.pk]))
+        # The feed first reads the page's keys (see FEED_QUERIES_PER_PAGE)
+        self.assertRevalidates(reverse('feed'), lambda: Post.objects.filter(
+            pk=self.posts[2].pk).adjust_counter('comments_count', 1), queries=3)
+
+    def test_empty_and_page_numbered_lists_carry_no_validators(self):
+        response = self.client.get(reverse('post-comments-list', args=[self.posts[1].pk]))
+        self.assertNotIn('ETag', response)
+        response = self.client.get(reverse('post-list'), {'page': 1})
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(**TEST_SETTINGS)
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, title='Cached', content='Body')
+        self.other = Post.objects.create(author=self.author, title='Other', content='Body')
+
+    def assertCached(self, url, **params):
+        first = self.client.get(url, params)
+        with self.assertNumQueries(0):
+            second = self.client.get(url, params)
+        self.assertEqual(second.data, first.data)
+        return second
+
+    def test_anonymous_post_list_and_detail_are_cached_per_query(self):
+        self.assertCached(reverse('post-list'))
+        self.assertCached(reverse('post-list'), page_size=1)
+        response = self.assertCached(reverse('post-detail', args=[self.post.pk]))
+        response = self.client.get(reverse('post-detail', args=[self.post.pk]),
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_authenticated_post_reads_bypass_the_cache(self):
+        self.client.force_authenticate(self.reader)
+        self.client.get(reverse('post-list'))
+        # Validators, page and previews; the author summaries stay cached
+        with self.assertNumQueries(3):
+            self.client.get(reverse('post-list'))
+
+    def test_like_invalidates_that_post_and_the_list_only(self):
+        list_url = reverse('post-list')
+        detail_url = reverse('post-detail', args=[self.post.pk])
+        other_url = reverse('post-detail', args=[self.other.pk])
+        for url in (list_url, detail_url, other_url):
+            self.client.get(url)
+
+        Like.objects.create(user=self.reader, post=self.post)
+        Post.objects.filter(pk=self.post.pk).adjust_counter('likes_count', 1)
+
+        self.assertEqual(self.client.get(detail_url).data['likes_count'], 1)
+        self.assertEqual(self.client.get(list_url).data['results'][-1]['likes_count'], 1)
+        with self.assertNumQueries(0):
+            self.client.get(other_url)
+
+    def test_comments_and_renames_invalidate(self):
+        comments_url = reverse('post-comments-list', args=[self.post.pk])
+        self.assertCached(comments_url)
+        Comment.objects.create(post=self.post, author=self.reader, content='Hi')
+        self.assertEqual(len(self.client.get(comments_url).data['results']), 1)
+
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertEqual(self.client.get(reverse('post-list')).data['results'][0]['author_username'], 'renamed')
+
+    def test_batch_like_invalidates_post_responses(self):
+        detail_url = reverse('post-detail', args=[self.post.pk])
+        self.client.get(detail_url)
+        self.client.force_authenticate(self.reader)
+        self.client.post(reverse('post-batch-like'), {'like': [self.post.pk]}, format='json')
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(detail_url).data['likes_count'], 1)
+
+
+@override_settings(**TEST_SETTINGS)
+class FollowProfileInvalidationTests(APITestCase):
+    def test_follows_made_through_the_relation_refresh_public_profiles(self):
+        cache.clear()
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        url = reverse('user-profile', args=['author'])
+        self.assertEqual(self.client.get(url).data['followers_count'], 0)
+        author.followers.add(reader)
+        User.objects.filter(pk=author.pk).update(followers_count=1)
+        self.assertEqual(self.client.get(url).data['followers_count'], 1)
+
+
+@override_settings(**TEST_SETTINGS, FEED_SYNC_OVERLAP=0)
+class FeedSyncTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.client.force_authenticate(self.reader)
+        self.client.post(reverse('follow-toggle', args=[self.author.pk]))
+        self.held = [self.create_post('Held 1'), self.create_post('Held 2')]
+
+    def create_post(self, title):
+        self.client.force_authenticate(self.author)
+        response = self.client.post(reverse('post-list'), {'title': title, 'content': 'Body'})
+        self.client.force_authenticate(self.reader)
+        return response.data['id']
+
+    def sync(self, watermark=None, ids=()):
+        params = {'ids': ','.join(map(str, ids))}
+        if watermark:
+            params['watermark'] = watermark
+        return self.client.get(reverse('feed-since'), params)
+
+    def test_first_sync_is_a_gap_with_a_watermark(self):
+        data = self.sync().data
+        self.assertTrue(data['gap'])
+        data = self.sync(data['watermark'], ids=self.held).data
+        self.assertFalse(data['gap'])
+        self.assertEqual((data['posts'], data['deleted'], data['changed']), ([], [], []))
+
+    def test_delta_has_new_posts_tombstones_and_counters(self):
+        watermark = self.sync().data['watermark']
+        new_id = self.create_post('Fresh')
+        Post.objects.get(pk=self.held[0]).delete()
+        self.client.post(reverse('post-toggle-like', args=[self.held[1]]))
+
+        data = self.sync(watermark, ids=self.held).data
+        self.assertFalse(data['gap'])
+        self.assertEqual([post['id'] for post in data['posts']], [new_id])
+        self.assertEqual(data['deleted'], [self.held[0]])
+        self.assertEqual([(row['id'], row['likes_count']) for row in data['changed']], [(self.held[1], 1)])
+
+    def test_too_many_new_posts_or_a_follow_change_is_a_gap(self):
+        watermark = self.sync().data['watermark']
+        self.create_post('One')
+        self.create_post('Two')
+        with self.settings(FEED_SYNC_MAX_POSTS=1):
+            self.assertTrue(self.sync(watermark).data['gap'])
+        self.assertFalse(self.sync(watermark).data['gap'])
+
+        self.client.post(reverse('follow-toggle', args=[self.author.pk]))
+        self.assertTrue(self.sync(watermark).data['gap'])
+
+    def test_watermarks_are_signed_and_bound_to_the_user(self):
+        self.assertEqual(self.sync('forged').status_code, status.HTTP_400_BAD_REQUEST)
+        watermark = self.sync().data['watermark']
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.sync(watermark).status_code, status.HTTP_400_BAD_REQUEST)
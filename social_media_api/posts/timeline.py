@@ -0,0 +1,227 @@
+# posts/timeline.py
+"""
+Materialized per-user timelines (fan-out-on-write).
+
+A new post is pushed into the timeline of every follower of its author, so the
+feed becomes a lookup of precomputed post ids. Authors with very large
+audiences are not fanned out: their posts are merged into the feed at read
+time instead (fan-out-on-read), which keeps the write cost bounded.
+
+A feed page is read by key, never sorted: one range of the owner's timeline
+index (posts_timeline_owner_idx) and one of each followed high-fanout
+author's posts (posts_post_author_recent_idx), merged in Python. Timelines
+are trimmed to their newest TIMELINE_MAX_LENGTH entries.
+"""
+import heapq
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from accounts import graph
+
+from . import sync
+from .models import Post, TimelineEntry
+from .pagination import seek_filter
+
+# Number of rows inserted per bulk_create statement
+FANOUT_BATCH_SIZE = 1000
+
+
+def is_enabled():
+    return getattr(settings, 'TIMELINE_ENABLED', True)
+
+
+def get_fanout_threshold():
+    return getattr(settings, 'TIMELINE_FANOUT_THRESHOLD', 10000)
+
+
+def get_max_length():
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 1000)
+
+
+def get_trim_interval():
+    return getattr(settings, 'TIMELINE_TRIM_INTERVAL', 50)
+
+
+def is_high_fanout(author):
+    """Authors at or above the threshold are read on demand, never fanned out."""
+    # Read the stored counter from the database; the instance may be stale
+    return type(author).objects.filter(
+        pk=author.pk, followers_count__gte=get_fanout_threshold()
+    ).exists()
+
+
+def _insert_entries(entries):
+    for start in range(0, len(entries), FANOUT_BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(
+            entries[start:start + FANOUT_BATCH_SIZE], ignore_conflicts=True
+        )
+
+
+def fan_out_post(post):
+    """Pushes a newly created post into the timeline of every follower."""
+    if not is_enabled() or is_high_fanout(post.author):
+        return 0
+
+    follower_ids = graph.follower_ids(post.author.pk)
+    _insert_entries([
+        TimelineEntry(owner_id=follower_id, post=post, created_at=post.created_at)
+        for follower_id in follower_ids
+    ])
+    # Trimming seeks into every follower's timeline, so it is spread out: the
+    # followers of one post in TIMELINE_TRIM_INTERVAL are trimmed
+    if post.pk % get_trim_interval() == 0:
+        trim(follower_ids)
+    return len(follower_ids)
+
+
+def trim(owner_ids):
+    """Deletes all but the newest TIMELINE_MAX_LENGTH entries of each timeline."""
+    length = get_max_length()
+    deleted = 0
+    for owner_id in owner_ids:
+        entries = TimelineEntry.objects.filter(owner_id=owner_id)
+        # The first entry past the cap, found by walking the index
+        boundary = list(_keys(entries, 'post_id')[length:length + 1])
+        if boundary:
+            created_at, post_id = boundary[0]
+            deleted += entries.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, post_id__lte=post_id)
+            ).delete()[0]
+    return deleted
+
+
+def backfill(follower, followee):
+    """Copies the followee's most recent posts into a new follower's timeline."""
+    sync.mark_feed_changed(follower.pk)
+    if not is_enabled() or is_high_fanout(followee):
+        return 0
+
+    limit = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+    recent_posts = (
+        Post.objects.filter(author=followee)
+        .order_by('-created_at', '-id')
+        .values_list('pk', 'created_at')[:limit]
+    )
+    entries = [
+        TimelineEntry(owner=follower, post_id=post_id, created_at=created_at)
+        for post_id, created_at in recent_posts
+    ]
+    _insert_entries(entries)
+    trim([follower.pk])
+    return len(entries)
+
+
+def backfill_many(follower, followees):
+    """
+    backfill() for many newly followed users at once: the recent posts of
+    every eligible followee are read with a single ROW_NUMBER() query.
+    """
+    if followees:
+        sync.mark_feed_changed(follower.pk)
+    if not is_enabled():
+        return 0
+
+    threshold = get_fanout_threshold()
+    author_ids = [followee.pk for followee in followees if followee.followers_count < threshold]
+    if not author_ids:
+        return 0
+
+    limit = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+    recent_posts = Post.objects.filter(author_id__in=author_ids).annotate(
+        backfill_rank=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=[F('created_at').desc(), F('id').desc()],
+        )
+    ).filter(backfill_rank__lte=limit).values_list('pk', 'created_at')
+    entries = [
+        TimelineEntry(owner=follower, post_id=post_id, created_at=created_at)
+        for post_id, created_at in recent_posts
+    ]
+    _insert_entries(entries)
+    trim([follower.pk])
+    return len(entries)
+
+
+def purge(follower, followee):
+    """Removes the followee's posts from the timeline of a former follower."""
+    sync.mark_feed_changed(follower.pk)
+    deleted, _ = TimelineEntry.objects.filter(owner=follower, post__author=followee).delete()
+    return deleted
+
+
+def rebuild(user):
+    """Recomputes a user's timeline from scratch (repairs drift, seeds old follows)."""
+    sync.mark_feed_changed(user.pk)
+    TimelineEntry.objects.filter(owner=user).delete()
+    followees = type(user).objects.filter(pk__in=list(graph.following_ids(user.pk)))
+    return sum(backfill(user, followee) for followee in followees)
+
+
+def _keys(queryset, id_field, position=None, reverse=False, since=None):
+    """
+    (created_at, post id) of ``queryset`` in feed order, newest first (oldest
+    first when ``reverse``), strictly past ``position`` and newer than ``since``.
+    """
+    ordering = ('created_at', id_field) if reverse else ('-created_at', '-' + id_field)
+    if position is not None:
+        queryset = queryset.filter(seek_filter(ordering, position))
+    if since is not None:
+        queryset = queryset.filter(created_at__gt=since)
+    return queryset.order_by(*ordering).values_list('created_at', id_field)
+
+
+def timeline_keys(user, position=None, reverse=False, since=None):
+    return _keys(TimelineEntry.objects.filter(owner=user), 'post_id', position, reverse, since)
+
+
+def author_keys(author_id, position=None, reverse=False, since=None):
+    return _keys(Post.objects.filter(author_id=author_id), 'id', position, reverse, since)
+
+
+def high_fanout_authors(user):
+    """
+    Followed authors whose posts are not fanned out. The followed ids come
+    from the cached follow graph, so only the users table is queried.
+    """
+    return type(user).objects.filter(
+        pk__in=list(graph.following_ids(user.pk)), followers_count__gte=get_fanout_threshold()
+    )
+
+
+def high_fanout_author_ids(user):
+    return list(high_fanout_authors(user).values_list('pk', flat=True))
+
+
+def feed_post_ids(user, limit, position=None, reverse=False, since=None):
+    """
+    Ids of up to ``limit`` feed posts in feed order (see _keys): a page of
+    the user's timeline merged with a page of each followed high-fanout
+    author, one index range read each.
+    """
+    sources = [timeline_keys(user, position, reverse, since)[:limit]]
+    sources += [
+        author_keys(author_id, position, reverse, since)[:limit]
+        for author_id in high_fanout_author_ids(user)
+    ]
+    # A post fanned out before its author crossed the threshold is in both
+    # sources; equal keys are adjacent after the merge
+    keys = (key for key, _ in groupby(heapq.merge(*sources, reverse=not reverse)))
+    return [post_id for _, post_id in islice(keys, limit)]
+
+
+def feed_queryset(user):
+    """
+    All posts of the user's feed as one queryset, newest first. Only numbered
+    pages (?page=) use it, as they need a total count; cursor pages and delta
+    syncs read feed_post_ids() instead.
+    """
+    high_fanout_author_pks = high_fanout_authors(user).values('pk')
+    timeline_post_ids = TimelineEntry.objects.filter(owner=user).values('post_id')
+
+    return Post.objects.filter(
+        Q(pk__in=timeline_post_ids) | Q(author__in=high_fanout_author_pks)
+    ).order_by('-created_at', '-id')
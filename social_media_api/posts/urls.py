@@ -2,7 +2,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter 
 
-from .views import PostViewSet, CommentViewSet, FeedView
+from .views import PostViewSet, CommentViewSet, FeedView, FeedSinceView, SuggestionView
 
 # 1. Main Router for Posts
 # Use the standard DRF DefaultRouter for Posts
@@ -14,6 +14,11 @@ urlpatterns = [
     
     # 1. Feed View
     path('feed/', FeedView.as_view(), name='feed'), 
+    # Delta sync: only what changed since the client's watermark
+    path('feed/since/', FeedSinceView.as_view(), name='feed-since'),
+
+    # Search-as-you-type over post titles and usernames
+    path('suggest/', SuggestionView.as_view(), name='suggest'),
 
     # 2. Liking and Unliking Paths (REQUIRED STRINGS)
     # These manually call the @action method 'toggle_like'
@@ -2,6 +2,7 @@
 Django settings for social_media_api project.
 """
 
+from datetime import timedelta
 from pathlib import Path
 import os
 import dj_database_url # For production database handling
@@ -98,8 +99,37 @@ DATABASES = {
 
 # Production Database Override
 DATABASE_URL = os.environ.get('DATABASE_URL')
+# Under ASGI (asgi.py sets DJANGO_SERVER_INTERFACE) every sync view runs in a
+# fresh thread, so a persistent connection would never be reused: close each
+# one at the end of its request instead of holding it open for conn_max_age.
+SERVED_OVER_ASGI = os.environ.get('DJANGO_SERVER_INTERFACE') == 'asgi'
 if DATABASE_URL:
-    DATABASES['default'] = dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+    DATABASES['default'] = dj_database_url.parse(
+        DATABASE_URL,
+        conn_max_age=0 if SERVED_OVER_ASGI else 600,
+        conn_health_checks=not SERVED_OVER_ASGI,
+    )
+
+
+# --- CACHE ---
+
+# Counters and cached lookups must be shared by every worker in production:
+# set REDIS_URL (the `redis` client is in requirements.txt). Without it each process uses
+# its own local-memory cache, which is fine for development and tests.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 
 # --- AUTHENTICATION & REST FRAMEWORK ---
@@ -119,16 +149,154 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# 'token': login/registration hand out DB-backed authtoken keys.
+# 'jwt': they hand out short-lived signed access + refresh tokens that are
+# verified in-process ("Authorization: Bearer <access>"); logout revokes them.
+AUTH_TOKEN_MODE = os.environ.get('AUTH_TOKEN_MODE', 'token')
+
+# Both schemes are accepted so clients can migrate; the first one is
+# advertised in 401 responses.
+AUTHENTICATION_CLASSES = [
+    # TokenAuthentication with token -> user lookups served from the cache
+    'accounts.authentication.CachedTokenAuthentication',
+    # Signed tokens checked without a database round-trip
+    'accounts.authentication.CachedJWTAuthentication',
+]
+if AUTH_TOKEN_MODE == 'jwt':
+    AUTHENTICATION_CLASSES.reverse()
+
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-    ],
-    'DEFAULT_PAGINATION_CLASS': 'posts.pagination.CustomPageNumberPagination',
-    'PAGE_SIZE': 10
+    'DEFAULT_AUTHENTICATION_CLASSES': AUTHENTICATION_CLASSES,
+    # Keyset (cursor) pagination; ?page= requests fall back to page numbers
+    'DEFAULT_PAGINATION_CLASS': 'posts.pagination.CursorOrPageNumberPagination',
+    'PAGE_SIZE': 10,
+    # Login/registration limits; counters are kept in the default cache
+    'DEFAULT_THROTTLE_RATES': {
+        'login': os.environ.get('LOGIN_RATE_PER_IP', '20/min'),
+        'login_username': os.environ.get('LOGIN_RATE_PER_USERNAME', '5/min'),
+        'register': os.environ.get('REGISTER_RATE_PER_IP', '10/hour'),
+    },
 }
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# ModelBackend with password checks bounded by accounts/hashing.py
+AUTHENTICATION_BACKENDS = ['accounts.hashing.HashingBackend']
+
+# Token -> user cache used by CachedTokenAuthentication: shared tier TTL, and
+# the per-process LRU (which other workers cannot invalidate, so keep it short).
+AUTH_TOKEN_CACHE_TTL = 300
+AUTH_TOKEN_LOCAL_CACHE_TTL = 10
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 1024
+# At most AUTH_HASH_MAX_CONCURRENT password hashes (login/registration) run at
+# once; other requests wait up to AUTH_HASH_QUEUE_TIMEOUT seconds for a slot
+# and then get a 503 (accounts/hashing.py).
+AUTH_HASH_MAX_CONCURRENT = int(os.environ.get('AUTH_HASH_MAX_CONCURRENT', 4))
+AUTH_HASH_QUEUE_TIMEOUT = 0.5
+AUTH_HASH_SLOW_SECONDS = 1.0 # hashes slower than this are logged
+
+# Revoked JWT ids remembered per process (the shared cache holds the rest)
+AUTH_JWT_REVOCATION_LOCAL_SIZE = 4096
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.environ.get('JWT_ACCESS_MINUTES', 5))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=int(os.environ.get('JWT_REFRESH_DAYS', 7))),
+    # Each refresh returns a new refresh token and revokes the old one
+    'ROTATE_REFRESH_TOKENS': True,
+    'UPDATE_LAST_LOGIN': False,
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.RevocableTokenRefreshSerializer',
+}
+
+# Lifetime of each user's cached following/follower id sets (accounts/graph.py)
+FOLLOW_GRAPH_CACHE_TTL = 10 * 60
+# Lifetime of the cached {id, username, avatar} summaries that posts, comments
+# and notifications embed (accounts/expansion.py)
+USER_SUMMARY_CACHE_TTL = 60
+# Lifetime of a rendered public profile (accounts/profiles.py)
+PUBLIC_PROFILE_CACHE_TTL = 5 * 60
+# Lifetime of cached read responses (posts/response_cache.py). Entries are
+# made unreachable by versioned namespaces on every relevant write, so this
+# only bounds how long superseded entries occupy the cache; 0 disables it.
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 5 * 60))
+# Most user ids accepted by one relationships/?ids= lookup
+RELATIONSHIPS_MAX_IDS = 300
+
+
+# --- FEED / TIMELINES ---
+
+# New posts are pushed into each follower's timeline (fan-out-on-write).
+# Authors with at least TIMELINE_FANOUT_THRESHOLD followers are skipped and
+# their posts are merged into the feed at read time instead.
+TIMELINE_ENABLED = os.environ.get('TIMELINE_ENABLED', 'True') == 'True'
+TIMELINE_FANOUT_THRESHOLD = int(os.environ.get('TIMELINE_FANOUT_THRESHOLD', 10000))
+# Number of recent posts copied into a timeline when someone follows an author
+TIMELINE_BACKFILL_LIMIT = int(os.environ.get('TIMELINE_BACKFILL_LIMIT', 200))
+# Timelines keep their newest TIMELINE_MAX_LENGTH entries; fan-out trims the
+# followers of one post in TIMELINE_TRIM_INTERVAL back to that length
+TIMELINE_MAX_LENGTH = int(os.environ.get('TIMELINE_MAX_LENGTH', 1000))
+TIMELINE_TRIM_INTERVAL = 50
+
+# Posts embed only their latest comments; clients choose how many with
+# ?comments=N (0 disables the preview) up to POST_COMMENT_PREVIEW_MAX.
+POST_COMMENT_PREVIEW_SIZE = 3
+POST_COMMENT_PREVIEW_MAX = 20
+
+# Delta sync (feed/since/, posts/sync.py): at most FEED_SYNC_MAX_POSTS new
+# posts per answer (beyond that the client is told to reload), at most
+# FEED_SYNC_MAX_IDS held post ids checked for deletions and counter changes,
+# watermarks valid for FEED_SYNC_MAX_AGE seconds, and FEED_SYNC_OVERLAP
+# seconds re-read behind each watermark for posts that committed late.
+FEED_SYNC_MAX_POSTS = 50
+FEED_SYNC_MAX_IDS = 300
+FEED_SYNC_MAX_AGE = 7 * 24 * 60 * 60
+FEED_SYNC_OVERLAP = 5
+
+# Full-text post search (posts/search.py): the PostgreSQL text search
+# configuration used for stemming, and how many ranked matches posts/search/
+# pages through.
+SEARCH_CONFIG = 'english'
+SEARCH_MAX_RESULTS = 100
+# Search-as-you-type (posts/suggestions.py): words are indexed up to
+# SUGGEST_MAX_PREFIX characters, SUGGEST_LIMIT posts and users are returned,
+# and each prefix's answer is cached (server and client side) for SUGGEST_CACHE_TTL seconds.
+SUGGEST_MAX_PREFIX = 15
+SUGGEST_LIMIT = 8
+SUGGEST_CACHE_TTL = 30
+
+
+# --- NOTIFICATIONS ---
+
+# 'async': requests only enqueue notifications; a background worker writes
+# them in batches and spills to the NotificationOutbox table so none are lost
+# on restart. 'sync': write them inside the request (used by the tests).
+NOTIFICATION_DISPATCH_MODE = os.environ.get('NOTIFICATION_DISPATCH_MODE', 'async')
+NOTIFICATION_BATCH_SIZE = 500
+NOTIFICATION_FLUSH_INTERVAL = 0.5 # seconds the worker waits for a batch to fill
+NOTIFICATION_OUTBOX_INTERVAL = 30 # seconds between outbox replays
+NOTIFICATION_QUEUE_SIZE = 10000
+# Repeats of the same (recipient, verb, target) within this many seconds are
+# folded into one aggregate row that keeps the NOTIFICATION_RECENT_ACTORS newest actors.
+NOTIFICATION_COALESCE_WINDOW = 24 * 60 * 60
+NOTIFICATION_RECENT_ACTORS = 3
+# Lifetime of the cached per-user unread counter (bounds any drift)
+NOTIFICATION_UNREAD_COUNT_TTL = 10 * 60
+
+# notifications/stream/ (Server-Sent Events, served over ASGI). Streams
+# are woken through NOTIFICATION_BROKER; with REDIS_URL set a write in any
+# worker reaches streams held by every worker.
+NOTIFICATION_BROKER = (
+    'notifications.broker.RedisBroker' if REDIS_URL else 'notifications.broker.LocalBroker'
+)
+NOTIFICATION_STREAM_HEARTBEAT = 15 # seconds between keep-alive comments
+NOTIFICATION_STREAM_MAX_AGE = 5 * 60 # seconds before a stream is closed; clients reconnect
+NOTIFICATION_STREAM_OVERLAP = 2 # seconds re-read behind each event id
+NOTIFICATION_STREAM_BATCH = 50 # notifications per event at most
+NOTIFICATION_STREAM_RETRY_MS = 3000 # reconnect delay advertised to EventSource
+# Under WSGI the stream long-polls: one event per response, sent when there is
+# news or after this many seconds
+NOTIFICATION_STREAM_LONG_POLL = 25
+
 
 # --- INTERNATIONALIZATION ---
 
@@ -143,6 +311,20 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# User uploads (profile pictures and their thumbnails)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Profile pictures are re-encoded as JPEG no larger than PROFILE_IMAGE_MAX_SIZE
+# px and stored under content-hashed names; thumbnails are built by a worker
+# pool after the upload commits ('sync' builds them inside the request).
+PROFILE_IMAGE_PROCESSING_MODE = os.environ.get('PROFILE_IMAGE_PROCESSING_MODE', 'async')
+PROFILE_IMAGE_WORKERS = 2
+PROFILE_IMAGE_MAX_BYTES = 5 * 1024 * 1024
+PROFILE_IMAGE_MAX_PIXELS = 25_000_000
+PROFILE_IMAGE_MAX_SIZE = 1024
+PROFILE_IMAGE_THUMBNAIL_SIZES = (48, 96, 256)
+
 # Configure WhiteNoise for production static file serving
 if not DEBUG:
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -1,4 +1,6 @@
 # social_media_api/urls.py
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
@@ -9,4 +11,8 @@ urlpatterns = [
     # NEW posts app URLs under /api/
     path('api/', include('posts.urls')), 
     path('api/notifications/', include('notifications.urls')),
-]
\ No newline at end of file
+]
+
+# Serve uploads in development; production serves MEDIA_ROOT from the web
+# server or object storage (file names are content-hashed, so cache them forever)
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)